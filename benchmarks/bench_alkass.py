@@ -0,0 +1,94 @@
+"""Benchmark AlKass tvguide page parsing on saved or synthetic pages.
+
+Compares the previous BeautifulSoup scraper (html.parser tree, nine
+find() calls, a pytz lookup and datetime.now() per page) against
+`providers.alkass.parse_day_page`, and times each extraction engine on
+its own. Pass saved pages (e.g. `curl -o today.html
+https://www.alkass.net/tvguide`) or let it build a synthetic one.
+
+    python benchmarks/bench_alkass.py today.html next.html
+    python benchmarks/bench_alkass.py --per-day 96 --iterations 50
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from bs4 import BeautifulSoup
+
+from common import add_import_paths
+
+add_import_paths()
+
+from fixtures import build_alkass
+from providers import alkass
+
+def parse_old(text, day):
+    """The previous implementation of fetch_alkass_day_data, minus the request."""
+    soup = BeautifulSoup(text, 'html.parser')
+    qatar_tz = pytz.timezone('Asia/Qatar')
+    current_date = datetime.now(qatar_tz)
+    if day == 'next':
+        current_date += timedelta(days=1)
+    data = {}
+    channel_names = ['one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'online']
+    for i in range(1, 10):
+        channel_key = f'alkass_{channel_names[i-1]}'
+        data[channel_key] = []
+        channel_div = soup.find('ul', id=f'cg{i}')
+        if not channel_div:
+            continue
+        for program in channel_div.find_all('tr'):
+            time_cell = program.find('td', class_='tv-prog-time')
+            name_cell = program.find('td', class_='tv-prog-name')
+            if time_cell and name_cell:
+                try:
+                    hour, minute = map(int, time_cell.get_text(strip=True).split(':'))
+                    program_time = current_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+                    data[channel_key].append((int(program_time.timestamp()), name_cell.get_text(strip=True)))
+                except ValueError:
+                    continue
+    return data
+
+def timed(func, args, iterations):
+    """Return (result, seconds per call) for the best of `iterations` calls."""
+    best = float('inf')
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pages', nargs='*', help='saved tvguide pages')
+    parser.add_argument('--per-day', type=int, default=48, help='programmes per channel in the synthetic page')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append((path, f.read()))
+    else:
+        pages = [(f'synthetic ({args.per_day}/channel/day)', build_alkass(args.per_day).decode())]
+
+    engines = [('bs4', alkass.extract_bs4), ('htmlparser', alkass.extract_htmlparser)]
+    if alkass.lxml is not None:
+        engines.append(('lxml', alkass.extract_lxml))
+
+    for name, text in pages:
+        print(f"{name}: {len(text) / 1024:.0f} KB")
+        old, old_seconds = timed(parse_old, (text, 'today'), args.iterations)
+        new, new_seconds = timed(alkass.parse_day_page, (text, 'today'), args.iterations)
+        print(f"  {'old scraper':>18}: {old_seconds * 1000:8.2f} ms")
+        print(f"  {'parse_day_page':>18}: {new_seconds * 1000:8.2f} ms  ({old_seconds / new_seconds:.1f}x)")
+        for engine, extract in engines:
+            lists, seconds = timed(extract, (text,), args.iterations)
+            rows = sum(len(rows) for rows in lists.values())
+            print(f"  {'extract ' + engine:>18}: {seconds * 1000:8.2f} ms  ({rows} rows)")
+        print("  Same programmes:", old == new)
+
+if __name__ == "__main__":
+    main()
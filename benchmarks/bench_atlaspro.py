@@ -0,0 +1,89 @@
+"""Benchmark AtlasPro XMLTV ingestion on a large synthetic feed.
+
+Compares the old whole-document `ET.fromstring` parse against the streaming
+`providers.atlaspro.parse` parser. Each variant runs in its own process so
+peak RSS is measured independently.
+
+    python benchmarks/bench_atlaspro.py --channels 2000 --programmes 150
+"""
+import argparse
+import calendar
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+from common import add_import_paths, measure
+
+add_import_paths()
+
+from channel_index import ChannelIndex
+from providers import atlaspro
+
+def write_feed(path, channels, programmes):
+    """Write a synthetic XMLTV feed that includes every mapped channel."""
+    mapped = list(atlaspro.get_channel_map())
+    channel_ids = mapped + [f'filler{i}.xx' for i in range(max(channels - len(mapped), 0))]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tv generator-info-name="bench">\n')
+        for channel_id in channel_ids:
+            f.write(f'  <channel id="{channel_id}"><display-name>{channel_id}</display-name></channel>\n')
+        first = calendar.timegm((2024, 1, 1, 0, 0, 0))
+        times = [time.strftime('%Y%m%d%H%M%S +0100', time.gmtime(first + n * 3600)) for n in range(programmes + 1)]
+        for channel_id in channel_ids:
+            for n in range(programmes):
+                f.write(
+                    f'  <programme start="{times[n]}" stop="{times[n + 1]}" channel="{channel_id}">\n'
+                    f'    <title>Programme {n} on {channel_id}</title>\n'
+                    f'    <desc>Synthetic description number {n} for the benchmark feed.</desc>\n'
+                    f'    <icon src="http://example.com/{channel_id}/{n}.png"/>\n'
+                    f'  </programme>\n'
+                )
+        f.write('</tv>\n')
+    return len(channel_ids) * programmes
+
+def parse_whole(path):
+    """The previous implementation: parse everything, then filter."""
+    channel_map = atlaspro.get_channel_map()
+    with open(path, 'rb') as f:
+        root = ET.fromstring(f.read())
+    programmes = []
+    for programme in root.findall('programme'):
+        programmes.append({
+            'channel_id': programme.get('channel'),
+            'start': programme.get('start'),
+            'stop': programme.get('stop'),
+            'title': programme.find('title').text if programme.find('title') is not None else '',
+            'desc': programme.find('desc').text if programme.find('desc') is not None else None,
+            'icon': programme.find('icon').get('src') if programme.find('icon') is not None else None
+        })
+    return sum(1 for p in programmes if p['channel_id'] in channel_map)
+
+def parse_streaming(path):
+    """The streaming implementation, given the id_key()-keyed map the generator passes."""
+    channel_map = atlaspro.get_channel_map()
+    keyed = ChannelIndex.from_channel_maps([channel_map]).provider_map(channel_map)
+    return sum(1 for _ in atlaspro.parse(open(path, 'rb'), keyed))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--channels', type=int, default=2000)
+    parser.add_argument('--programmes', type=int, default=150, help='programmes per channel')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'xmltv.xml')
+        total = write_feed(path, args.channels, args.programmes)
+        size = os.path.getsize(path) / (1024 * 1024)
+        print(f"Feed: {total} programmes, {size:.1f} MB")
+        counts = {}
+        for name, func in [('fromstring', parse_whole), ('iterparse', parse_streaming)]:
+            count, elapsed, rss = measure(func, path)
+            counts[name] = count
+            print(f"{name:>12}: {elapsed:7.2f}s  peak RSS {rss:8.1f} MB  ({count} mapped programmes)")
+    if counts['fromstring'] != counts['iterparse']:
+        sys.exit("FAILED both parsers should keep the same programmes")
+
+if __name__ == "__main__":
+    main()
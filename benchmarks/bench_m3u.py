@@ -0,0 +1,62 @@
+"""Benchmark playlist filtering on a large synthetic Xtream m3u_plus playlist.
+
+Compares the old read-everything/split/re.search filter against the
+streaming `source.filter_playlist`. Each variant runs in its own process so
+peak RSS is measured independently.
+
+    python benchmarks/bench_m3u.py --entries 500000
+"""
+import argparse
+import os
+import re
+import tempfile
+
+from common import add_import_paths, measure
+
+add_import_paths()
+
+from fixtures import write_playlist
+from source import GROUP_WHITELIST, filter_playlist
+
+def filter_old(path, output_path):
+    """The previous implementation of source.py."""
+    with open(path, encoding='utf-8') as f:
+        data = f.read()
+    entries = data.split("#EXTINF")
+    filtered_entries = []
+    for entry in entries:
+        if 'group-title="' in entry:
+            match = re.search(r'group-title="([^"]+)"', entry)
+            if match:
+                group = match.group(1)
+                if group in GROUP_WHITELIST:
+                    filtered_entries.append("#EXTINF" + entry)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("#EXTM3U\n" + "".join(filtered_entries))
+    return len(filtered_entries)
+
+def filter_streaming(path, output_path):
+    """The streaming implementation."""
+    with open(path, encoding='utf-8') as stream, open(output_path, 'w', encoding='utf-8') as f:
+        return filter_playlist(stream, f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=500000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'playlist.m3u')
+        write_playlist(path, args.entries)
+        size = os.path.getsize(path) / (1024 * 1024)
+        print(f"Playlist: {args.entries} entries, {size:.1f} MB")
+        outputs = {}
+        for name, func in [('split+re', filter_old), ('streaming', filter_streaming)]:
+            outputs[name] = os.path.join(tmp, f'{name}.m3u')
+            count, elapsed, rss = measure(func, path, outputs[name])
+            print(f"{name:>12}: {elapsed:7.2f}s  peak RSS {rss:8.1f} MB  ({count} entries kept)")
+        with open(outputs['split+re'], 'rb') as a, open(outputs['streaming'], 'rb') as b:
+            print("Outputs identical:", a.read() == b.read())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Benchmark the EPG and playlist pipelines end to end, offline.
+
+Provider responses are replayed from a local stub server: synthetic ones
+by default, scaled by --channels/--days/--per-day/--entries, or recorded
+ones from a --fixtures directory. Three scenarios are run, each in a fresh
+process:
+
+    epg-cold   generate_epg() with an empty HTTP cache and programme store
+    epg-warm   a second run, where everything revalidates and merges unchanged
+    playlist   source.py filtering, splitting and compressing the playlist
+
+Time and the growth of the peak RSS are reported per stage, taken from
+the pipelines' own metrics, with the whole process's peak RSS as the
+total, and the best of --repeat runs is kept. --save-baseline stores the
+results; --check compares against them and exits with status 1 on a
+regression. Baselines are machine specific, so record one on the machine
+that runs the check.
+
+    python benchmarks/bench_pipeline.py --save-baseline
+    python benchmarks/bench_pipeline.py --check
+    python benchmarks/bench_pipeline.py --record-from .cache/epg --fixtures recorded/
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+from common import ROOT, add_import_paths, measure
+
+add_import_paths()
+
+import metrics
+import source
+from epg_generator import generate_epg
+from fixtures import record_from_cache, write_fixtures
+from providers import adtv, alkass, atlaspro, shahid
+from stub_server import FixtureServer
+
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+TOLERANCE = 0.25
+MIN_DELTA_SECONDS = 0.05  # ignore slowdowns smaller than timer noise
+MIN_DELTA_MB = 5
+
+def _stage_results(pipeline):
+    """Return {stage: {'seconds': ..., 'rss_growth_mb': ...}} from the metrics registry."""
+    samples = metrics.REGISTRY.to_dict()
+    stages = {}
+    for sample in samples.get(f'{pipeline}_stage_seconds', []):
+        stages.setdefault(sample['labels']['stage'], {})['seconds'] = sample['value']
+    for sample in samples.get(f'{pipeline}_stage_rss_growth_bytes', []):
+        stages.setdefault(sample['labels']['stage'], {})['rss_growth_mb'] = sample['value'] / (1024 * 1024)
+    return stages
+
+def run_epg(base_url, workdir):
+    shahid.SHAHID_URL = base_url + '/shahid'
+    adtv.ADTV_URL = base_url + '/adtv'
+    alkass.ALKASS_URL = base_url + '/alkass'
+    atlaspro.ATLASPRO_URL = base_url + '/atlaspro'
+    os.chdir(workdir)
+    with redirect_stdout(io.StringIO()):
+        generate_epg()
+    return _stage_results('epg')
+
+def run_playlist(base_url, workdir):
+    source.URL = base_url + '/playlist'
+    os.chdir(workdir)
+    with redirect_stdout(io.StringIO()):
+        source.main()
+    return _stage_results('playlist')
+
+def run_scenarios(server, repeat):
+    """Run every scenario `repeat` times and keep the best time and memory of each stage."""
+    best = {}
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as workdir:
+            for scenario, func in [('epg-cold', run_epg), ('epg-warm', run_epg), ('playlist', run_playlist)]:
+                stages, seconds, rss = measure(func, server.base_url, workdir)
+                stages['total'] = {'seconds': seconds, 'peak_rss_mb': rss}
+                for stage, values in stages.items():
+                    kept = best.setdefault(scenario, {}).setdefault(stage, dict(values))
+                    for key, value in values.items():
+                        kept[key] = min(kept[key], value)
+    return best
+
+def compare(results, baseline, tolerance):
+    """Return a description of every stage that regressed against `baseline`."""
+    regressions = []
+    for scenario, stages in results.items():
+        for stage, values in stages.items():
+            old = baseline['results'].get(scenario, {}).get(stage)
+            if not old:
+                continue
+            for key, unit, min_delta in [('seconds', 's', MIN_DELTA_SECONDS), ('peak_rss_mb', ' MB', MIN_DELTA_MB),
+                                         ('rss_growth_mb', ' MB', MIN_DELTA_MB)]:
+                if key not in values or key not in old:
+                    continue
+                if values[key] > old[key] * (1 + tolerance) and values[key] - old[key] > min_delta:
+                    regressions.append(f"{scenario}/{stage} {key}: {old[key]:.2f}{unit} -> {values[key]:.2f}{unit}")
+    return regressions
+
+def _format_rss(values):
+    """Format a stage's peak RSS growth ("+12.0 MB") or a run's peak RSS ("80.0 MB")."""
+    if 'rss_growth_mb' in values:
+        return f"{values['rss_growth_mb']:+.1f} MB"
+    return f"{values.get('peak_rss_mb', 0):.1f} MB"
+
+def print_results(results, baseline=None):
+    print(f"{'scenario':<10} {'stage':<10} {'time':>9} {'peak RSS':>11}")
+    for scenario, stages in results.items():
+        for stage in sorted(stages, key=lambda name: name == 'total'):
+            values = stages[stage]
+            line = f"{scenario:<10} {stage:<10} {values['seconds']:8.2f}s {_format_rss(values):>11}"
+            old = baseline and baseline['results'].get(scenario, {}).get(stage)
+            if old:
+                line += f"   (baseline {old['seconds']:.2f}s, {_format_rss(old)})"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--channels', type=int, default=200, help='channels per provider, mapped ones included')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--per-day', type=int, default=30, help='programmes per channel per day')
+    parser.add_argument('--entries', type=int, default=200000, help='playlist entries')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--fixtures', help='replay the recorded responses in this directory')
+    parser.add_argument('--record-from', metavar='CACHE_DIR',
+                        help="copy responses from the generator's HTTP cache into --fixtures first")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown, as a fraction')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on a regression')
+    args = parser.parse_args()
+
+    if args.record_from:
+        if not args.fixtures:
+            parser.error('--record-from needs --fixtures')
+        print(f"Recorded {', '.join(record_from_cache(args.record_from, args.fixtures)) or 'nothing'}")
+    if args.fixtures:
+        params = {'fixtures': os.path.basename(os.path.normpath(args.fixtures))}
+    else:
+        params = {'channels': args.channels, 'days': args.days, 'per_day': args.per_day, 'entries': args.entries}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.fixtures
+        if not directory:
+            directory = os.path.join(tmp, 'fixtures')
+            write_fixtures(directory, args.channels, args.days, args.per_day, args.entries)
+        with FixtureServer(directory) as server:
+            results = run_scenarios(server, args.repeat)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['params'] != params:
+            print(f"Baseline was recorded with {baseline['params']}, not comparing")
+            baseline = None
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}")
+    elif args.check:
+        if baseline is None:
+            sys.exit("No comparable baseline; run with --save-baseline first")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions (tolerance {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Exercise probe.py against a local fake upstream with known-good and known-bad streams.
+
+The fake upstream serves a mix of live .ts and .m3u8 streams, plain URLs
+(one of which refuses HEAD), dead URLs (404), streams with the wrong
+content and streams slower than the probe timeout, plus URLs on a port
+nothing listens on. Every channel must be classified as expected, dead
+ones must be pointed at the slate, and no more than --per-host probes may
+hit the upstream at once. The run fails (status 1) otherwise.
+
+    python benchmarks/bench_probe.py --urls 1400 --timeout 1
+"""
+import argparse
+import select
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import add_import_paths
+
+add_import_paths()
+
+import probe
+from m3u import M3UEntry
+
+# kind: (path template, probe should find it alive)
+KINDS = {
+    'live-ts': ('/live/{n}.ts', True),
+    'live-hls': ('/live/{n}/index.m3u8', True),
+    'page': ('/page/{n}', True),
+    'no-head': ('/nohead/{n}', True),
+    'dead': ('/dead/{n}.ts', False),
+    'wrong-content': ('/wrong/{n}.ts', False),
+    'slow': ('/slow/{n}.ts', False),
+    'unreachable': (None, False),
+}
+SLATE_URL = 'http://slate.invalid/offline.m3u8'
+
+class FakeUpstream(ThreadingHTTPServer):
+    """Answer each path prefix the way its kind of stream would."""
+    daemon_threads = True
+    request_queue_size = 128  # with the default 5, dropped connects outlast the probe timeout
+
+    def __init__(self, delay):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def base(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.answer(head=True)
+
+    def do_GET(self):
+        self.answer(head=False)
+
+    def answer(self, head):
+        server = self.server
+        with server._lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            server.requests[self.command] += 1
+        try:
+            kind = self.path.split('/')[1]
+            if kind == 'nohead' and head:
+                self.send(405, b'')
+            elif kind == 'dead':
+                self.send(404, b'not found')
+            elif kind == 'wrong':
+                self.send(200, b'<html><body>Account expired</body></html>')
+            elif kind == 'slow':
+                if self.client_waited(server.delay):
+                    self.send(200, b'\x47' + bytes(187))
+            elif self.path.endswith('.m3u8'):
+                self.send(200, b'#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.0,\nseg1.ts\n')
+            elif self.path.endswith('.ts'):
+                self.send(200, b'\x47' + bytes(188 * 10 - 1))
+            else:
+                self.send(200, b'ok')
+        except ConnectionError:
+            pass
+        finally:
+            with server._lock:
+                server.active -= 1
+
+    def client_waited(self, seconds):
+        """Sleep up to `seconds`; return False as soon as the client hangs up."""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            readable, _, _ = select.select([self.connection], [], [], 0.05)
+            if readable and not self.connection.recv(1, socket.MSG_PEEK):
+                return False
+        return True
+
+    def send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+def closed_port():
+    """Return a local port nothing listens on."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def build_entries(base, count):
+    """Return [(M3UEntry, kind)] cycling through every kind of URL."""
+    dead_base = f'http://127.0.0.1:{closed_port()}'
+    entries = []
+    kinds = list(KINDS)
+    for n in range(count):
+        kind = kinds[n % len(kinds)]
+        template = KINDS[kind][0]
+        url = base + template.format(n=n) if template else f'{dead_base}/live/{n}.ts'
+        entries.append((M3UEntry(f'#EXTINF:-1 tvg-id="C{n}.xx" group-title="{kind}",Channel {n}\n{url}\n'), kind))
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--urls', type=int, default=1400)
+    parser.add_argument('--timeout', type=float, default=1)
+    parser.add_argument('--concurrency', type=int, default=probe.CONCURRENCY)
+    parser.add_argument('--per-host', type=int, default=probe.PER_HOST)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(delay=args.timeout * 2)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    try:
+        labelled = build_entries(upstream.base, args.urls)
+        entries = [entry for entry, _ in labelled]
+        started = time.monotonic()
+        kept, report = probe.probe_playlist(entries, mode='slate', offline_url=SLATE_URL,
+                                            concurrency=args.concurrency, per_host=args.per_host,
+                                            timeout=args.timeout)
+        elapsed = time.monotonic() - started
+    finally:
+        upstream.shutdown()
+
+    problems = []
+    wrong = Counter()
+    for (entry, kind), channel, kept_entry in zip(labelled, report['channels'], kept):
+        expected = KINDS[kind][1]
+        if channel['ok'] != expected:
+            wrong[kind] += 1
+            print(f"  {kind} {entry.url}: {channel['error']}")
+        if kept_entry.url != (entry.url if expected else SLATE_URL):
+            wrong[kind + ' (rewrite)'] += 1
+    print(f"{report['channels_checked']} channels checked in {elapsed:.1f}s: "
+          f"{report['alive']} alive, {report['dead']} dead")
+    print(f"  upstream: {dict(upstream.requests)} requests, at most {upstream.max_active} at once")
+    for kind, count in sorted(wrong.items()):
+        problems.append(f"{count} {kind} channels misclassified")
+    if len(kept) != len(entries):
+        problems.append(f"{len(entries) - len(kept)} channels went missing in slate mode")
+    if upstream.max_active > args.per_host:
+        problems.append(f"{upstream.max_active} probes hit one host at once (limit {args.per_host})")
+
+    for problem in problems:
+        print(f"FAILED {problem}")
+    if problems:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark the Programme model against the old dict + ElementTree path.
+
+Builds a large multi-day guide as a Shahid-style JSON payload and converts it
+both ways: the old per-programme strptime/strftime + ET.SubElement tree, and
+the new providers.shahid.parse into pooled Programme objects. Reports the
+conversion time and the memory each representation keeps once the raw
+payload has been released.
+
+    python benchmarks/bench_programme.py --channels 300 --days 7 --per-day 40
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+
+from common import add_import_paths, measure
+
+add_import_paths()
+
+from providers import shahid
+
+def build_payload(channels, days, per_day):
+    """Return a Shahid-style JSON payload (as bytes) and its channel map."""
+    slot = timedelta(days=1) / per_day
+    start_of_guide = datetime(2024, 1, 1)
+    items = []
+    for c in range(channels):
+        programmes = []
+        for n in range(days * per_day):
+            start = start_of_guide + slot * n
+            programmes.append({
+                'from': start.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'to': (start + slot).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                # Titles and descriptions repeat, as reruns and series do
+                'title': f'Show {n % per_day}',
+                'description': f'Episode guide text for show {n % per_day} on channel {c}.',
+            })
+        items.append({'channelId': str(c), 'items': programmes})
+    channel_map = {str(c): {'name': f'Channel {c}', 'tvg_id': f'Channel{c}.xx'} for c in range(channels)}
+    return json.dumps({'items': items}).encode(), channel_map
+
+def convert_old(data, channel_map):
+    """The previous representation: one ET.Element tree for every programme."""
+    tv = ET.Element('tv')
+    for channel_data in data['items']:
+        tvg_id = channel_map[channel_data['channelId']]['tvg_id']
+        for program in channel_data['items']:
+            start = datetime.strptime(program['from'], '%Y-%m-%dT%H:%M:%S.%fZ')
+            stop = datetime.strptime(program['to'], '%Y-%m-%dT%H:%M:%S.%fZ')
+            programme = ET.SubElement(tv, 'programme')
+            programme.set('start', start.strftime('%Y%m%d%H%M%S %z'))
+            programme.set('stop', stop.strftime('%Y%m%d%H%M%S %z'))
+            programme.set('channel', tvg_id)
+            title = ET.SubElement(programme, 'title')
+            title.text = program.get('title', '')
+            if program.get('description'):
+                desc = ET.SubElement(programme, 'desc')
+                desc.text = program.get('description')
+    return tv, len(tv)
+
+def convert_new(data, channel_map):
+    """The Programme model."""
+    programmes = list(shahid.parse(data, channel_map))
+    return programmes, len(programmes)
+
+def run(name, channels, days, per_day):
+    """Convert one way and return (programmes, seconds, bytes kept per programme).
+
+    Timing and memory use come from separate passes, since tracemalloc
+    slows the conversion down considerably.
+    """
+    convert = {'old': convert_old, 'new': convert_new}[name]
+    payload, channel_map = build_payload(channels, days, per_day)
+
+    data = json.loads(payload)
+    started = time.perf_counter()
+    result, count = convert(data, channel_map)
+    elapsed = time.perf_counter() - started
+    del data, result
+    gc.collect()
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    data = json.loads(payload)
+    result, count = convert(data, channel_map)
+    del data
+    gc.collect()
+    kept = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return count, elapsed, kept / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--channels', type=int, default=300)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--per-day', type=int, default=40)
+    args = parser.parse_args()
+
+    for name, label in [('old', 'dict+Element'), ('new', 'Programme')]:
+        (count, elapsed, per_programme), wall, rss = measure(run, name, args.channels, args.days, args.per_day)
+        print(f"{label:>13}: {count} programmes, convert {elapsed:6.2f}s, "
+              f"{per_programme:6.0f} bytes kept per programme, peak RSS {rss:7.1f} MB")
+
+if __name__ == "__main__":
+    main()
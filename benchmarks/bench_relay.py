@@ -0,0 +1,213 @@
+"""Exercise relay.py against a local fake upstream, with many clients per channel.
+
+The fake upstream serves a continuous MPEG-TS channel and a live HLS
+channel, counting every connection it gets. Clients then watch both
+channels through the relay, upstream is taken down, and the clients must
+keep receiving the offline slate until upstream comes back. The run fails
+(status 1) if the relay opened more than one upstream stream per channel,
+left clients hanging or never went back to upstream.
+
+    python benchmarks/bench_relay.py --clients 50 --seconds 5
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+from common import add_import_paths
+
+add_import_paths()
+
+import relay
+from m3u import M3UEntry
+
+SEGMENT_SECONDS = 1
+SEGMENT_BYTES = relay.TS_PACKET * 2000
+STREAM_RATE = 512 * 1024  # bytes per second of the fake TS channel
+
+class FakeUpstream:
+    """A TS stream at /live/1.ts and a live HLS playlist at /hls/index.m3u8."""
+
+    def __init__(self):
+        self.requests = Counter()
+        self.down = False
+        self.started = time.monotonic()
+        self._writers = set()
+
+    def sequence(self):
+        return int((time.monotonic() - self.started) / SEGMENT_SECONDS)
+
+    async def handle(self, reader, writer):
+        try:
+            (_, target), _ = relay.parse_head(await reader.readuntil(b'\r\n\r\n'))
+        except (ValueError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        kind = 'stream' if target.endswith('.ts') and target.startswith('/live/') else \
+            'playlist' if target.endswith('.m3u8') else 'segment'
+        self.requests[kind] += 1
+        self._writers.add(writer)
+        try:
+            if self.down:
+                writer.write(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n')
+            elif kind == 'stream':
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: video/mp2t\r\n\r\n')
+                packet = b'\x47' + bytes(relay.TS_PACKET - 1)
+                chunk = packet * (STREAM_RATE // 10 // relay.TS_PACKET)
+                while not self.down:
+                    writer.write(chunk)
+                    await writer.drain()
+                    await asyncio.sleep(0.1)
+            elif kind == 'playlist':
+                sequence = self.sequence()
+                lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:1', f'#EXT-X-MEDIA-SEQUENCE:{sequence}']
+                for n in range(sequence, sequence + 3):
+                    lines += [f'#EXTINF:{SEGMENT_SECONDS}.0,', f'seg{n}.ts']
+                body = ('\n'.join(lines) + '\n').encode()
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+            else:
+                body = b'\x47' + bytes(SEGMENT_BYTES - 1)
+                # Chunked, to exercise the relay's de-chunking
+                writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n')
+                for start in range(0, len(body), 65536):
+                    part = body[start:start + 65536]
+                    writer.write(b'%x\r\n' % len(part) + part + b'\r\n')
+                writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def take_down(self):
+        self.down = True
+        for writer in list(self._writers):
+            writer.close()
+
+async def http_get(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n'.encode())
+    status, headers = relay.parse_head(await reader.readuntil(b'\r\n\r\n'))
+    body = await reader.readexactly(int(headers['content-length']))
+    writer.close()
+    return status, body
+
+async def watch_stream(port, path, seconds, received):
+    """Read a TS channel for `seconds`, counting the bytes and bad sync bytes."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n'.encode())
+    await reader.readuntil(b'\r\n\r\n')
+    deadline = time.monotonic() + seconds
+    buffer = b''
+    try:
+        while time.monotonic() < deadline:
+            data = await asyncio.wait_for(reader.read(65536), max(deadline - time.monotonic(), 0.01))
+            if not data:
+                break
+            received['bytes'] += len(data)
+            buffer += data
+            end = len(buffer) - len(buffer) % relay.TS_PACKET
+            received['bad_sync'] += sum(1 for i in range(0, end, relay.TS_PACKET) if buffer[i] != 0x47)
+            buffer = buffer[end:]
+    except asyncio.TimeoutError:
+        pass
+    writer.close()
+
+async def watch_hls(port, path, seconds, received):
+    """Poll an HLS channel like a player, fetching each new segment once."""
+    deadline = time.monotonic() + seconds
+    fetched = set()
+    while time.monotonic() < deadline:
+        status, body = await http_get(port, path)
+        if status != 200:
+            received['errors'] += 1
+        for line in body.decode().splitlines():
+            if line and not line.startswith('#') and line not in fetched:
+                fetched.add(line)
+                status, segment = await http_get(port, line)
+                received['segments'] += 1
+                received['bytes'] += len(segment)
+                received['slate'] += line.startswith('/offline/')
+                received['errors'] += status != 200
+        await asyncio.sleep(SEGMENT_SECONDS / 2)
+
+async def run(clients, seconds):
+    upstream = FakeUpstream()
+    upstream_server = await asyncio.start_server(upstream.handle, '127.0.0.1', 0)
+    base = f'http://127.0.0.1:{upstream_server.sockets[0].getsockname()[1]}'
+    entries = [
+        M3UEntry(f'#EXTINF:-1 tvg-id="Stream.xx",Stream\n{base}/live/1.ts\n'),
+        M3UEntry(f'#EXTINF:-1 tvg-id="Live.xx",Live\n{base}/hls/index.m3u8\n'),
+    ]
+    relay.RETRY_DELAY = 1
+    server = relay.Relay(entries)
+    relay_server = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+    port = relay_server.sockets[0].getsockname()[1]
+
+    results = {}
+    for phase in ('live', 'down', 'back'):
+        if phase == 'down':
+            upstream.take_down()
+        elif phase == 'back':
+            upstream.down = False
+        before = Counter(upstream.requests)
+        stream, hls = Counter(), Counter()
+        started = time.monotonic()
+        await asyncio.gather(*[watch_stream(port, '/channel/0.ts', seconds, stream) for _ in range(clients)],
+                             *[watch_hls(port, '/channel/1.m3u8', seconds, hls) for _ in range(clients)])
+        results[phase] = {
+            'seconds': time.monotonic() - started,
+            'stream': stream,
+            'hls': hls,
+            'upstream': upstream.requests - before,
+        }
+
+    # Let both ends notice the clients are gone before the loop stops
+    upstream.take_down()
+    await asyncio.sleep(0.5)
+    relay_server.close()
+    upstream_server.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=20, help='clients per channel')
+    parser.add_argument('--seconds', type=float, default=4, help='how long each phase lasts')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.clients, args.seconds))
+    problems = []
+    for phase, result in results.items():
+        stream, hls, upstream = result['stream'], result['hls'], result['upstream']
+        print(f"{phase}: {args.clients} clients per channel for {result['seconds']:.1f}s")
+        print(f"  TS stream: {stream['bytes'] / 1024 / 1024:.1f} MB delivered, "
+              f"{upstream['stream']} upstream connections, {stream['bad_sync']} misaligned packets")
+        print(f"  HLS: {hls['segments']} segments delivered ({hls['slate']} slate), "
+              f"{upstream['segment']} fetched upstream, {upstream['playlist']} playlist fetches, "
+              f"{hls['errors']} errors")
+        if stream['bad_sync']:
+            problems.append(f"{phase}: TS clients got misaligned packets")
+        if not stream['bytes'] or not hls['segments']:
+            problems.append(f"{phase}: clients were left without data")
+        if hls['errors']:
+            problems.append(f"{phase}: HLS clients got errors")
+    live = results['live']['upstream']
+    if live['stream'] != 1:
+        problems.append(f"live: {live['stream']} upstream connections for one TS channel")
+    if live['segment'] > live['playlist'] * 3:
+        problems.append("live: HLS segments were fetched upstream more than once")
+    if not results['down']['hls']['slate']:
+        problems.append("down: HLS clients never got the slate")
+    back = results['back']
+    if not back['upstream']['stream'] or back['hls']['segments'] == back['hls']['slate']:
+        problems.append("back: the relay did not return to upstream")
+
+    for problem in problems:
+        print(f"FAILED {problem}")
+    if problems:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
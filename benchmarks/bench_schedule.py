@@ -0,0 +1,60 @@
+"""Benchmark the schedule normaliser on week-long multi-source guides.
+
+Every channel gets a full week from two sources whose slots are offset
+from each other, plus exact duplicates and a few gaps, so every kind of
+repair happens. The guide is normalised at growing sizes; the time per
+programme should stay flat (linear overall).
+
+    python benchmarks/bench_schedule.py --channels 300 --days 7 --per-day 40
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from common import add_import_paths
+
+add_import_paths()
+
+from programme import Programme
+from schedule import FIXES, normalise_schedules
+
+def build_guide(channels, days, per_day, seed=1):
+    """Return [(source, Programme)] ordered like ProgrammeStore.iter_programmes."""
+    rng = random.Random(seed)
+    slot = 86400 // per_day
+    rows = []
+    for c in range(channels):
+        channel = f'Channel{c}.xx'
+        for n in range(days * per_day):
+            start = n * slot
+            if rng.random() < 0.02:  # leave the odd gap
+                continue
+            rows.append(('primary', Programme(channel, start, start + slot, f'Show {n % per_day}')))
+            shifted = start + slot // 3
+            rows.append(('aggregator', Programme(channel, shifted, shifted + slot, f'Show {n % per_day}')))
+            if rng.random() < 0.1:
+                rows.append(('mirror', Programme(channel, start, start + slot, f'Show {n % per_day}')))
+    rows.sort(key=lambda row: (row[1].channel, row[1].start, row[0]))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--channels', type=int, default=300)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--per-day', type=int, default=40)
+    parser.add_argument('--fill-gaps', type=int, default=3600)
+    args = parser.parse_args()
+
+    for scale in (1, 2, 4):
+        rows = build_guide(args.channels * scale // 4, args.days, args.per_day)
+        fixes = Counter()
+        started = time.perf_counter()
+        written = sum(1 for _ in normalise_schedules(rows, ('primary', 'aggregator'), args.fill_gaps, fixes))
+        elapsed = time.perf_counter() - started
+        print(f"{len(rows):>8} programmes -> {written:>7} in {elapsed:6.2f}s "
+              f"({elapsed / len(rows) * 1e6:5.2f} us each): "
+              + ", ".join(f"{fixes[fix]} {fix}" for fix in FIXES))
+
+if __name__ == "__main__":
+    main()
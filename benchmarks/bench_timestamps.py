@@ -0,0 +1,109 @@
+"""Benchmark timestamp parsing/formatting against the old per-programme strptime/strftime.
+
+Generates a guide's worth of back-to-back programme times (each stop is the
+next start, as in real feeds), with different start times and programme
+lengths on every channel, and converts them both ways: ISO 8601 the way
+Shahid does (one channel's starts, then its stops, per batch), XMLTV the
+way AtlasPro does (memoised over the whole feed), and epochs back to XMLTV
+strings the way the writer emits them. The results must match.
+
+Times fall on whole minutes, like real guides, which is what lets the
+feed-wide XMLTV memo hit across channels; the ISO batches only gain from
+the slice-based parser.
+
+    python benchmarks/bench_timestamps.py --channels 300 --days 7 --per-day 40
+"""
+import argparse
+import calendar
+import random
+import sys
+import time
+from datetime import datetime
+
+from common import add_import_paths
+
+add_import_paths()
+
+import timeutil
+
+def build_times(channels, days, per_day, seed=1):
+    """Return one [(start, stop), ...] epoch list per channel."""
+    rng = random.Random(seed)
+    slot = 86400 // per_day
+    first = calendar.timegm((2024, 1, 1, 0, 0, 0))
+    guide = []
+    for _ in range(channels):
+        start = first + rng.randrange(0, slot, 60)
+        times = []
+        for _ in range(days * per_day):
+            stop = start + rng.randrange(slot // 2, slot * 3 // 2, 60)
+            times.append((start, stop))
+            start = stop
+        guide.append(times)
+    return guide
+
+def old_iso(value):
+    return calendar.timegm(datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ').timetuple())
+
+def old_xmltv(value):
+    epoch = calendar.timegm((int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                             int(value[8:10]), int(value[10:12]), int(value[12:14] or 0)))
+    offset = value[14:].strip()
+    if offset:
+        sign = -1 if offset[0] == '-' else 1
+        epoch -= sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+    return epoch
+
+def old_format(epoch):
+    return time.strftime('%Y%m%d%H%M%S +0000', time.gmtime(epoch))
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--channels', type=int, default=300)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--per-day', type=int, default=40)
+    args = parser.parse_args()
+
+    guide = build_times(args.channels, args.days, args.per_day)
+    epochs = [epoch for times in guide for pair in times for epoch in pair]
+    iso = [[(time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(start)),
+             time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(stop))) for start, stop in times]
+           for times in guide]
+    xmltv = [time.strftime('%Y%m%d%H%M%S +0300', time.gmtime(epoch + 3 * 3600)) for epoch in epochs]
+
+    def new_iso():
+        result = []
+        for channel in iso:
+            starts = timeutil.to_epochs([start for start, _ in channel], timeutil.iso_to_epoch)
+            stops = timeutil.to_epochs([stop for _, stop in channel], timeutil.iso_to_epoch)
+            result.extend(epoch for pair in zip(starts, stops) for epoch in pair)
+        return result
+
+    def new_xmltv():
+        to_epoch = timeutil.cached(timeutil.xmltv_to_epoch)
+        return [to_epoch(v) for v in xmltv]
+
+    cases = [
+        ('ISO 8601', lambda: [old_iso(v) for channel in iso for pair in channel for v in pair], new_iso),
+        ('XMLTV', lambda: [old_xmltv(v) for v in xmltv], new_xmltv),
+        ('format', lambda: [old_format(e) for e in epochs], lambda: [timeutil.format_xmltv(e) for e in epochs]),
+    ]
+    failed = False
+    print(f"{len(epochs)} timestamps")
+    for label, old, new in cases:
+        old_result, old_seconds = timed(old)
+        new_result, new_seconds = timed(new)
+        same = old_result == new_result
+        failed |= not same
+        print(f"{label:>9}: old {old_seconds:6.2f}s, new {new_seconds:6.2f}s "
+              f"({old_seconds / new_seconds:4.1f}x){'' if same else '  RESULTS DIFFER'}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
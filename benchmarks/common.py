@@ -0,0 +1,36 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import resource
+import sys
+import time
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def add_import_paths():
+    """Make the repository scripts (source.py, epg/*.py) importable."""
+    for path in (ROOT, os.path.join(ROOT, 'epg')):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+def _measure(func, args, queue):
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((result, elapsed, peak_rss / 1024))
+
+def measure(func, *args):
+    """Run func(*args) in a fresh process and return (result, seconds, peak RSS in MB).
+
+    `func` must be importable from the benchmark module, since the child
+    process is spawned rather than forked.
+    """
+    ctx = get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(func, args, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"{func.__name__} failed with exit code {process.exitcode}")
+    return queue.get()
@@ -0,0 +1,154 @@
+"""Provider fixtures for the offline benchmarks.
+
+Synthetic responses are generated in each provider's own format (Shahid and
+ADTV JSON, AlKass HTML, AtlasPro XMLTV, Xtream m3u_plus) and scale with
+the number of channels, days and programmes per day. Guides start at
+midnight UTC yesterday so that most programmes are still current when the
+pipeline runs. Real responses can be recorded from the generator's HTTP
+cache instead.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+
+from common import add_import_paths
+
+add_import_paths()
+
+from providers import adtv, alkass, atlaspro, shahid
+from source import GROUP_WHITELIST
+
+# Fixture file for each provider response, keyed by the stub server route
+FILES = {
+    'shahid': 'shahid.json',
+    'adtv': 'adtv.json',
+    'alkass': 'alkass_today.html',
+    'alkass_next': 'alkass_next.html',
+    'atlaspro': 'atlaspro.xml',
+    'playlist': 'playlist.m3u',
+}
+ALKASS_CHANNELS = 9
+GROUPS = sorted(GROUP_WHITELIST) + [f'VOD {i}' for i in range(40)] + [f'COUNTRY {i}' for i in range(30)]
+
+def guide_start():
+    """Return midnight UTC yesterday, where synthetic guides begin."""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=1)
+
+def _channel_ids(mapped, channels):
+    """Every mapped id plus unmapped fillers, `channels` in total at least."""
+    mapped = list(mapped)
+    return mapped + [f'filler{i}' for i in range(max(channels - len(mapped), 0))]
+
+def _slots(days, per_day):
+    slot = timedelta(days=1) / per_day
+    start = guide_start()
+    for n in range(days * per_day):
+        yield n, start + slot * n, start + slot * (n + 1)
+
+def build_shahid(channels, days, per_day):
+    items = []
+    for channel_id in _channel_ids(shahid.get_channel_map(), channels):
+        items.append({'channelId': channel_id, 'items': [{
+            'from': start.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'to': stop.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'title': f'Show {n % per_day}',
+            'description': f'Episode guide text for show {n % per_day} on {channel_id}.',
+        } for n, start, stop in _slots(days, per_day)]})
+    return json.dumps({'items': items}).encode()
+
+def build_adtv(channels, days, per_day):
+    response = []
+    for channel_id in _channel_ids(adtv.get_channel_map(), channels):
+        response.append({'channelExternalId': channel_id, 'programs': [{
+            'startDate': int(start.timestamp() * 1000),
+            'endDate': int(stop.timestamp() * 1000),
+            'name': f'Programme {n % per_day}',
+            'description': f'Synthetic ADTV programme {n % per_day}.',
+        } for n, start, stop in _slots(days, per_day)]})
+    return json.dumps({'response': response}).encode()
+
+def build_alkass(per_day):
+    """One day of the AlKass guide page (the site only serves today and tomorrow)."""
+    parts = ['<html><body><div class="tv-guide">']
+    for i in range(1, ALKASS_CHANNELS + 1):
+        parts.append(f'<ul id="cg{i}"><li><table>')
+        for n, start, _ in _slots(1, per_day):
+            parts.append(f'<tr><td class="tv-prog-time">{start:%H:%M}</td>'
+                         f'<td class="tv-prog-name">Match {n} - Alkass {i}</td></tr>')
+        parts.append('</table></li></ul>')
+    parts.append('</div></body></html>')
+    return ''.join(parts).encode()
+
+def write_atlaspro(path, channels, days, per_day):
+    mapped = list(atlaspro.get_channel_map())
+    channel_ids = mapped + [f'filler{i}.xx' for i in range(max(channels - len(mapped), 0))]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tv generator-info-name="bench">\n')
+        for channel_id in channel_ids:
+            f.write(f'  <channel id="{channel_id}"><display-name>{channel_id}</display-name></channel>\n')
+        for channel_id in channel_ids:
+            for n, start, stop in _slots(days, per_day):
+                f.write(
+                    f'  <programme start="{start:%Y%m%d%H%M%S} +0000" stop="{stop:%Y%m%d%H%M%S} +0000" channel="{channel_id}">\n'
+                    f'    <title>Programme {n % per_day} on {channel_id}</title>\n'
+                    f'    <desc>Synthetic description number {n % per_day} for the benchmark feed.</desc>\n'
+                    f'  </programme>\n'
+                )
+        f.write('</tv>\n')
+
+def write_playlist(path, entries):
+    """Write a synthetic playlist that mixes whitelisted and other groups."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('#EXTM3U x-tvg-url="http://example.com/xmltv.php"\n')
+        for n in range(entries):
+            group = GROUPS[n % len(GROUPS)]
+            f.write(
+                f'#EXTINF:-1 tvg-id="channel{n}.xx" tvg-name="Channel {n}" '
+                f'tvg-logo="http://example.com/logos/{n}.png" group-title="{group}",Channel {n}\n'
+                f'http://example.com/live/user/pass/{n}.ts\n'
+            )
+
+def write_fixtures(directory, channels, days, per_day, entries):
+    """Write a full synthetic fixture set to `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    def path(route):
+        return os.path.join(directory, FILES[route])
+    with open(path('shahid'), 'wb') as f:
+        f.write(build_shahid(channels, days, per_day))
+    with open(path('adtv'), 'wb') as f:
+        f.write(build_adtv(channels, days, per_day))
+    for route in ('alkass', 'alkass_next'):
+        with open(path(route), 'wb') as f:
+            f.write(build_alkass(per_day))
+    write_atlaspro(path('atlaspro'), channels, days, per_day)
+    write_playlist(path('playlist'), entries)
+
+def record_from_cache(cache_dir, directory):
+    """Copy the provider responses stored in the generator's HTTP cache to `directory`.
+
+    Returns the routes that were found. The playlist is not cached by
+    source.py; save one as playlist.m3u in `directory` by hand.
+    """
+    prefixes = [
+        ('alkass_next', alkass.ALKASS_URL + '?day=next'),
+        ('alkass', alkass.ALKASS_URL),
+        ('shahid', shahid.SHAHID_URL),
+        ('adtv', adtv.ADTV_URL),
+        ('atlaspro', atlaspro.ATLASPRO_URL),
+    ]
+    os.makedirs(directory, exist_ok=True)
+    found = []
+    for name in sorted(os.listdir(cache_dir)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(cache_dir, name), encoding='utf-8') as f:
+            url = json.load(f).get('url', '')
+        for route, prefix in prefixes:
+            if url.startswith(prefix):
+                shutil.copyfile(os.path.join(cache_dir, name[:-len('.json')] + '.body'),
+                                os.path.join(directory, FILES[route]))
+                found.append(route)
+                break
+    return found
@@ -0,0 +1,67 @@
+"""Local HTTP server that replays provider fixtures.
+
+Each provider route serves one fixture file from a directory (see
+fixtures.FILES). Responses carry an ETag and honour If-None-Match, so
+a second pipeline run exercises the HTTP cache revalidation path just
+like it does against the real providers.
+"""
+import os
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from fixtures import FILES
+
+CHUNK_SIZE = 64 * 1024
+
+class FixtureHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        route = url.path.strip('/').split('/')[0]
+        if route == 'alkass' and parse_qs(url.query).get('day') == ['next']:
+            route = 'alkass_next'
+        path = os.path.join(self.server.directory, FILES.get(route, ''))
+        if route not in FILES or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(stat.st_size))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+class FixtureServer(ThreadingHTTPServer):
+    """Serve the fixtures in `directory` on a free localhost port."""
+    daemon_threads = True
+
+    def __init__(self, directory):
+        super().__init__(('127.0.0.1', 0), FixtureHandler)
+        self.directory = directory
+        self.base_url = f'http://127.0.0.1:{self.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+        self.server_close()
+
+    def url(self, route):
+        """Return the URL to give the pipeline for a fixture route."""
+        return f'{self.base_url}/{route}'
@@ -0,0 +1,259 @@
+"""Channel-ID resolution shared by the EPG and the playlist.
+
+A ChannelIndex holds the canonical XMLTV channel ids (the `tvg_id`s the
+EPG publishes) and precomputed lookup tables onto them:
+
+- ids, compared case-insensitively ("tf1.fr" -> "TF1.fr")
+- aliases from the ALIASES table
+- display names, normalised so that country prefixes, quality tags,
+  accents, case and punctuation do not matter ("FR: TF1 Séries Films
+  FHD" -> "TF1SeriesFilms.fr")
+- a fuzzy fallback on normalised names for whatever is left, memoised
+  per name so a playlist of tens of thousands of entries is still
+  resolved in close to O(1) per entry
+"""
+import json
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+EPG_CHANNELS_FILE = 'epg_channels.json'  # published with epg.xml: {channel id: display name}
+FUZZY_CUTOFF = 0.85
+
+# Alternative ids and names seen in feeds and playlists -> canonical tvg id
+ALIASES = {
+    'ARTE.fr': ['Arte France'],
+    'EmiratesTV.ae': ['Al Emarat', 'Emarat TV', 'Emirates TV'],
+    'AbuDhabiTV.ae': ['Abu Dhabi', 'Abu Dhabi Channel', 'AD TV'],
+    'LeFigaroTV.fr': ['ViaGrandParis.fr', 'Via Grand Paris', 'Figaro TV'],
+    'TiVi5Monde.fr': ['Tivi5.fr', 'TV5 Monde Kids'],
+    'TV5MondeStyle.fr': ['TV5Style.fr', 'TV5 Style'],
+    'France24.fr': ['France 24 FR', 'France 24 French'],
+    'France24English.fr': ['France24.uk', 'France 24 EN'],
+    'AlJazeeraEnglish.qa': ['aljazeera.uk', 'Al Jazeera EN'],
+    'BBCNewsArabic.uk': ['bbcarabiccanada.ca', 'BBC Arabic'],
+    'CanalPlus.fr': ['Canal Plus', 'Canal+ France'],
+    'AlkassSHOOF.qa': ['Alkass Online', 'Alkass Shoof'],
+}
+
+# Playlist name decorations: "FR: ", "|AR| ", "[FR] ", "(backup)", "FHD", ...
+PREFIX_RE = re.compile(r'^\s*(?:\|[^|]*\||\[[^\]]*\]|[a-z]{2,3}\s*[:|])\s*')
+BRACKETS_RE = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+QUALITY_TOKENS = {'hd', 'fhd', 'uhd', 'sd', '4k', '8k', 'hq', 'lq', 'h264', 'h265', 'hevc',
+                  '720p', '1080p', '2160p', 'backup', 'bk'}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+DIGITS_RE = re.compile(r'\d+')
+
+def id_key(channel_id):
+    """Return the lookup key for a channel id: case-insensitive, trimmed."""
+    return str(channel_id).strip().casefold() if channel_id else ''
+
+def _strip_accents(value):
+    if value.isascii():
+        return value
+    return ''.join(c for c in unicodedata.normalize('NFKD', value) if not unicodedata.combining(c))
+
+def name_key(name):
+    """Return the lookup key for a display name, ignoring decorations."""
+    if not name:
+        return ''
+    value = _strip_accents(name).casefold()
+    value = PREFIX_RE.sub('', value)
+    value = BRACKETS_RE.sub(' ', value).replace('+', ' plus ').replace('&', ' and ')
+    return ''.join(token for token in TOKEN_RE.findall(value) if token not in QUALITY_TOKENS)
+
+def id_stem(channel_id):
+    """Return an id without its country suffix, "TF1SeriesFilms.fr" -> "TF1SeriesFilms"."""
+    stem, dot, suffix = channel_id.rpartition('.')
+    return stem if dot and suffix.isalpha() and len(suffix) <= 3 else channel_id
+
+class ChannelIndex:
+    """Resolve provider ids, playlist tvg-ids and names to canonical channel ids."""
+
+    def __init__(self):
+        self.names = {}  # canonical id -> display name
+        self._ids = {}  # id key -> canonical id
+        self._names = {}  # name key -> canonical id
+        self._blocks = {}  # first characters of a name key -> (name key, its numbers), for fuzzy matching
+        self._fuzzy = {}  # name key -> canonical id or None, memoised fuzzy results
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, channel_id):
+        return channel_id in self.names
+
+    def add(self, channel_id, name=None):
+        """Register a canonical channel and return its canonical id.
+
+        An id that only differs in case from a known one is folded into it.
+        """
+        canonical = self._ids.get(id_key(channel_id))
+        if canonical is None:
+            canonical = channel_id
+            self.names[canonical] = name or id_stem(channel_id)
+            self._ids[id_key(canonical)] = canonical
+        self._add_name(id_stem(canonical), canonical)
+        if name:
+            self._add_name(name, canonical)
+        return canonical
+
+    def add_alias(self, alias, channel_id):
+        """Make an alternative id or name resolve to a canonical channel."""
+        canonical = self._ids.get(id_key(channel_id))
+        if canonical is None:
+            return
+        self._ids.setdefault(id_key(alias), canonical)
+        # Names are aliases too: id_stem() leaves anything without a country suffix alone
+        self._add_name(id_stem(alias), canonical)
+
+    def _add_name(self, name, canonical):
+        key = name_key(name)
+        if key and key not in self._names:
+            self._names[key] = canonical
+            self._blocks.setdefault(key[:2], []).append((key, DIGITS_RE.findall(key)))
+            self._fuzzy.clear()
+
+    def resolve_id(self, channel_id):
+        """Return the canonical id for an id or alias, or None."""
+        return self._ids.get(id_key(channel_id))
+
+    def resolve_name(self, name, fuzzy=True):
+        """Return the canonical id for a display name, or None."""
+        key = name_key(name)
+        if not key:
+            return None
+        canonical = self._names.get(key)
+        if canonical is not None or not fuzzy:
+            return canonical
+        if key not in self._fuzzy:
+            self._fuzzy[key] = self._match_fuzzy(key)
+        return self._fuzzy[key]
+
+    def _match_fuzzy(self, key):
+        """Return the canonical id of the closest known name, or None.
+
+        Only names sharing the first characters are compared, and the
+        numbers in both names must be equal ("beIN Sports 1" never matches
+        "beIN Sports 2").
+        """
+        digits = DIGITS_RE.findall(key)
+        candidates = [candidate for candidate, numbers in self._blocks.get(key[:2], ()) if numbers == digits]
+        if not candidates:
+            return None
+        best, best_ratio = None, FUZZY_CUTOFF
+        matcher = SequenceMatcher(b=key, autojunk=False)
+        for candidate in candidates:
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        return self._names[best] if best is not None else None
+
+    def resolve(self, channel_id=None, name=None, fuzzy=True):
+        """Return the canonical id for an entry's id and/or name, or None."""
+        canonical = self.resolve_id(channel_id) if channel_id else None
+        if canonical is None and channel_id:
+            canonical = self._names.get(name_key(id_stem(channel_id)))
+        if canonical is None and name:
+            canonical = self.resolve_name(name, fuzzy)
+        return canonical
+
+    def provider_map(self, channel_map):
+        """Return a provider channel map keyed by id_key() and pointing at canonical ids."""
+        return {
+            id_key(provider_id): dict(info, tvg_id=self.resolve_id(info['tvg_id']) or info['tvg_id'])
+            for provider_id, info in channel_map.items()
+        }
+
+    @classmethod
+    def from_channel_maps(cls, channel_maps, aliases=ALIASES):
+        """Build the index from provider channel maps ({id: {'name', 'tvg_id'}})."""
+        index = cls()
+        for channel_map in channel_maps:
+            for info in channel_map.values():
+                index.add(info['tvg_id'], info['name'])
+        index.add_aliases(aliases)
+        return index
+
+    @classmethod
+    def from_channels_file(cls, path=EPG_CHANNELS_FILE, aliases=ALIASES):
+        """Build the index from the channel list published with the EPG."""
+        index = cls()
+        with open(path, encoding='utf-8') as f:
+            for channel_id, name in sorted(json.load(f).items()):
+                index.add(channel_id, name)
+        index.add_aliases(aliases)
+        return index
+
+    def add_aliases(self, aliases):
+        """Register an {canonical id: [alias, ...]} table."""
+        for channel_id, alternatives in aliases.items():
+            for alias in alternatives:
+                self.add_alias(alias, channel_id)
+
+class EntryResolver:
+    """Point playlist entries at canonical EPG ids, remembering what did not match."""
+
+    def __init__(self, index):
+        self.index = index
+        self.resolved = 0
+        self.used = set()  # canonical ids at least one entry resolved to
+        self.unmapped = {}  # (tvg-id, name) -> report entry
+        self._memo = {}
+
+    def reset(self):
+        """Forget what the last run resolved, keeping the memoised matches."""
+        self.resolved = 0
+        self.used = set()
+        self.unmapped = {}
+
+    def resolve(self, entry):
+        """Return the entry with its tvg-id set to the canonical id.
+
+        Entries that cannot be resolved are returned unchanged and recorded.
+        """
+        tvg_id = entry.tvg_id
+        name = entry.tvg_name or entry.name
+        key = (tvg_id, name)
+        if key not in self._memo:
+            self._memo[key] = self.index.resolve(tvg_id, name)
+        canonical = self._memo[key]
+        if canonical is None:
+            report = self.unmapped.get(key)
+            if report is None:
+                report = self.unmapped[key] = {'tvg_id': tvg_id, 'name': name, 'group': entry.group_title, 'entries': 0}
+            report['entries'] += 1
+            return entry
+        self.resolved += 1
+        self.used.add(canonical)
+        return entry if canonical == tvg_id else entry.with_attr('tvg-id', canonical)
+
+    def write_report(self, path):
+        write_unmapped_report(path, self.unmapped.values(), set(self.index.names) - self.used)
+
+def write_channels_file(path, names):
+    """Write {channel id: display name} as the channel list published with the EPG.
+
+    The output is sorted, so an unchanged list gives the same bytes.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(names.items())), f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+def write_unmapped_report(path, unmapped, unused=()):
+    """Write the channels that could not be resolved, and the EPG channels nobody uses.
+
+    `unmapped` holds dicts describing each unresolved entry.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'unmapped': list(unmapped), 'unused_epg_channels': sorted(unused)}, f,
+                  indent=2, ensure_ascii=False)
+        f.write('\n')
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,201 @@
+"""Resident service that keeps the EPG and the playlists refreshed.
+
+    python daemon.py --metrics-dir metrics
+    python daemon.py --every shahid=300 --every playlist=600 --jitter 0.2
+
+Instead of paying interpreter start-up, imports and new TLS connections on
+every cron run, the service stays up and keeps each source's HTTP session,
+the providers' channel maps and the playlist's tvg-id matches in memory.
+Every EPG provider and the playlist are refreshed on their own interval:
+providers that are due together share one EPG run, and the playlist runs
+after it so it resolves against the newest EPG channel list. Each interval is
+stretched or shrunk by a random `jitter`, and a source that fails is
+retried sooner, backing off exponentially, without holding up the others.
+
+Published files are only ever replaced by os.replace() of a complete
+file, so readers see either the old or the new version. SIGINT/SIGTERM
+stop the service once the current run has finished.
+"""
+import argparse
+import os
+import random
+import signal
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'epg'))
+
+import epg_generator
+import metrics
+import source
+from channel_index import EPG_CHANNELS_FILE, ChannelIndex, EntryResolver
+from providers import PROVIDERS, load_provider, provider_session
+from providers.base import EPG_DAYS
+from publish import compress_all
+
+PLAYLIST = 'playlist'
+INTERVALS = {  # seconds between refreshes; cheap when upstream has not changed
+    'shahid': 900,
+    'adtv': 900,
+    'alkass': 900,
+    'atlaspro': 3600,
+    PLAYLIST: 600,
+}
+JITTER = 0.1
+BACKOFF = 60  # first retry after a failure, doubled per consecutive failure
+MAX_BACKOFF = 3600
+
+class Job:
+    """One source's refresh schedule."""
+
+    def __init__(self, name, interval, jitter=JITTER):
+        self.name = name
+        self.interval = interval
+        self.jitter = jitter
+        self.failures = 0
+        self.due = time.monotonic()
+
+    def done(self, ok):
+        """Schedule the next run after one that succeeded or failed."""
+        if ok:
+            self.failures = 0
+            delay = self.interval
+        else:
+            self.failures += 1
+            delay = min(BACKOFF * 2 ** (self.failures - 1), MAX_BACKOFF)
+        self.due = time.monotonic() + delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+class Daemon:
+    """Run the due jobs, reusing sessions and parsed channel data between runs."""
+
+    def __init__(self, intervals, jitter=JITTER, fill_gaps=0, metrics_dir=None, days=EPG_DAYS):
+        self.jobs = [Job(name, interval, jitter) for name, interval in intervals.items()]
+        self.fill_gaps = fill_gaps
+        self.days = days
+        self.metrics_dir = metrics_dir
+        self.stopping = threading.Event()
+        providers = [load_provider(name) for name in PROVIDERS]
+        self.sessions = {provider.NAME: provider_session(provider) for provider in providers
+                         if provider.NAME in intervals}
+        # Every provider's channels go in each epg.xml, whichever were refreshed
+        self.channel_maps = {provider.NAME: provider.get_channel_map() for provider in providers}
+        self.playlist_session = requests.Session()
+        self._resolver = None
+        self._resolver_mtime = None
+
+    def resolver(self):
+        """Return the playlist's EntryResolver, rebuilt only when the EPG's channels changed."""
+        if not os.path.exists(EPG_CHANNELS_FILE):
+            return None
+        mtime = os.path.getmtime(EPG_CHANNELS_FILE)
+        if mtime != self._resolver_mtime:
+            self._resolver = EntryResolver(ChannelIndex.from_channels_file(EPG_CHANNELS_FILE))
+            self._resolver_mtime = mtime
+        else:
+            self._resolver.reset()
+        return self._resolver
+
+    def run_pipeline(self, pipeline, func, *args):
+        """Run one pipeline with a fresh metrics registry; return its result or raise."""
+        metrics.REGISTRY.clear()
+        options = argparse.Namespace(profile=None, metrics=None)
+        if self.metrics_dir:
+            options.metrics = os.path.join(self.metrics_dir, f'{pipeline}.prom')
+        return metrics.run(pipeline, func, options, *args)
+
+    def refresh_epg(self, jobs):
+        names = [job.name for job in jobs]
+        print(f"Refreshing EPG: {', '.join(names)}")
+        try:
+            results = self.run_pipeline('epg', epg_generator.generate_epg, names, self.fill_gaps,
+                                        self.sessions, self.channel_maps, self.days)
+            compress_all([epg_generator.OUTPUT_FILE])
+        except Exception as e:
+            print(f"EPG run failed: {type(e).__name__}: {e}")
+            results = {}
+        for job in jobs:
+            result = results.get(job.name)
+            self.reschedule(job, result is not None and result.ok)
+
+    def refresh_playlist(self, job):
+        print("Refreshing playlist")
+        try:
+            self.run_pipeline(PLAYLIST, source.main, self.playlist_session, self.resolver())
+            ok = True
+        except Exception as e:
+            print(f"Playlist run failed: {type(e).__name__}: {e}")
+            ok = False
+        self.reschedule(job, ok)
+
+    def reschedule(self, job, ok):
+        delay = job.done(ok)
+        if not ok:
+            print(f"  {job.name} failed {job.failures} time(s) in a row, retrying in about {delay}s")
+
+    def run_due(self, force=False):
+        """Run every job that is due (all of them with `force`)."""
+        now = time.monotonic()
+        due = [job for job in self.jobs if force or job.due <= now]
+        # The EPG first, so the playlist resolves against its newest channels
+        epg_jobs = [job for job in due if job.name in PROVIDERS]
+        if epg_jobs:
+            self.refresh_epg(epg_jobs)
+        for job in due:
+            if job.name == PLAYLIST and not self.stopping.is_set():
+                self.refresh_playlist(job)
+
+    def serve(self):
+        """Run jobs as they fall due until stop() is called."""
+        while not self.stopping.is_set():
+            self.run_due()
+            next_due = min(job.due for job in self.jobs)
+            self.stopping.wait(max(next_due - time.monotonic(), 0))
+
+    def stop(self, *_):
+        if not self.stopping.is_set():
+            print("Stopping once the current run has finished")
+        self.stopping.set()
+
+def parse_interval(value):
+    name, _, seconds = value.partition('=')
+    if name not in INTERVALS:
+        raise argparse.ArgumentTypeError(f"unknown source: {name} (one of {', '.join(INTERVALS)})")
+    try:
+        return name, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number of seconds: {seconds!r}") from None
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the EPG and the playlists refreshed.")
+    parser.add_argument('--every', type=parse_interval, action='append', default=[], metavar='SOURCE=SECONDS',
+                        help=f"refresh interval of a source ({', '.join(INTERVALS)}); 0 disables it")
+    parser.add_argument('--jitter', type=float, default=JITTER, help='random share by which intervals vary')
+    parser.add_argument('--days', type=int, default=EPG_DAYS,
+                        help=f"days of guide to request from providers that take a window (default: {EPG_DAYS})")
+    parser.add_argument('--fill-gaps', type=int, default=0, metavar='SECONDS',
+                        help="extend programmes over gaps up to this long before the next one (default: off)")
+    parser.add_argument('--metrics-dir', metavar='DIR',
+                        help='write each run\'s metrics to DIR/epg.prom and DIR/playlist.prom')
+    parser.add_argument('--once', action='store_true', help='refresh everything once and exit')
+    args = parser.parse_args()
+
+    intervals = dict(INTERVALS, **dict(args.every))
+    intervals = {name: seconds for name, seconds in intervals.items() if seconds > 0}
+    if not intervals:
+        parser.error("every source is disabled")
+    if args.days < 1:
+        parser.error("--days must be at least 1")
+    daemon = Daemon(intervals, args.jitter, args.fill_gaps, args.metrics_dir, args.days)
+    if args.once:
+        daemon.run_due(force=True)
+        return
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.serve()
+
+if __name__ == "__main__":
+    main()
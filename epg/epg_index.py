@@ -0,0 +1,169 @@
+"""Programme index for fast "now/next" and time-range lookups.
+
+The generator writes every programme it puts in epg.xml to a small SQLite
+database as well, keyed and indexed on (channel, start), so consumers can
+answer schedule questions with an index seek instead of parsing the XML.
+
+    python epg/epg_index.py now MBC1.sa
+    python epg/epg_index.py range MBC1.sa --from 2024-01-01T18:00 --to 2024-01-01T23:00
+"""
+import argparse
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+INDEX_FILE = 'epg.db'
+BATCH_SIZE = 5000
+
+Listing = namedtuple('Listing', ['channel', 'start', 'stop', 'title', 'desc', 'icon'])
+
+SCHEMA = '''
+CREATE TABLE channels (id TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE programmes (channel TEXT, start INTEGER, stop INTEGER, title TEXT, desc TEXT, icon TEXT);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+'''
+
+class ProgrammeIndexWriter:
+    """Build the index file alongside the XMLTV output.
+
+    Has the same write_channel/write_programme interface as XMLTVWriter so
+    it can be attached to it as a sink. The file is built under a temporary
+    name and moved into place on close.
+    """
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self._tmp_path = path + '.tmp'
+        self._conn = None
+        self._batch = []
+        self._max_duration = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self):
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._conn = sqlite3.connect(self._tmp_path)
+        self._conn.execute('PRAGMA journal_mode = OFF')
+        self._conn.execute('PRAGMA synchronous = OFF')
+        self._conn.executescript(SCHEMA)
+
+    def write_channel(self, channel_id, display_name):
+        self._conn.execute('INSERT OR REPLACE INTO channels VALUES (?, ?)', (channel_id, display_name))
+
+    def write_programme(self, programme):
+        self._max_duration = max(self._max_duration, programme.stop - programme.start)
+        self._batch.append((programme.channel, programme.start, programme.stop,
+                            programme.title, programme.desc, programme.icon))
+        if len(self._batch) >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._conn.executemany('INSERT INTO programmes VALUES (?, ?, ?, ?, ?, ?)', self._batch)
+        self._batch = []
+
+    def close(self):
+        if self._conn is None:
+            return
+        self._flush()
+        self._conn.execute('CREATE INDEX programmes_channel_start ON programmes (channel, start)')
+        self._conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ('generated_at', int(time.time())),
+            ('max_duration', self._max_duration),
+        ])
+        self._conn.commit()
+        self._conn.close()
+        self._conn = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        if self._conn is None:
+            return
+        self._conn.close()
+        self._conn = None
+        os.remove(self._tmp_path)
+
+class ProgrammeIndex:
+    """Read-only queries over an index file. Times are UTC epoch seconds."""
+
+    def __init__(self, path=INDEX_FILE):
+        self._conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'max_duration'").fetchone()
+        self._max_duration = row[0] if row else 0
+
+    def close(self):
+        self._conn.close()
+
+    def channels(self):
+        """Return {channel id: display name}."""
+        return dict(self._conn.execute('SELECT id, name FROM channels ORDER BY id'))
+
+    def now_next(self, channel, at=None):
+        """Return the (current, next) Listing on a channel; either may be None."""
+        at = time.time() if at is None else at
+        row = self._conn.execute(
+            'SELECT * FROM programmes WHERE channel = ? AND start <= ? ORDER BY start DESC LIMIT 1',
+            (channel, at)).fetchone()
+        current = Listing(*row) if row and row[2] > at else None
+        row = self._conn.execute(
+            'SELECT * FROM programmes WHERE channel = ? AND start > ? ORDER BY start LIMIT 1',
+            (channel, at)).fetchone()
+        return current, Listing(*row) if row else None
+
+    def between(self, channel, start, stop):
+        """Return the Listings on a channel that overlap [start, stop)."""
+        rows = self._conn.execute(
+            'SELECT * FROM programmes WHERE channel = ? AND start >= ? AND start < ? AND stop > ? ORDER BY start',
+            (channel, start - self._max_duration, stop, start))
+        return [Listing(*row) for row in rows]
+
+def _parse_time(value):
+    """Parse an ISO date/time from the command line; naive values are UTC."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def _format_listing(listing):
+    start = datetime.fromtimestamp(listing.start, timezone.utc).strftime('%Y-%m-%d %H:%M')
+    stop = datetime.fromtimestamp(listing.stop, timezone.utc).strftime('%H:%M')
+    return f"{start}-{stop} UTC  {listing.title}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the EPG programme index.")
+    parser.add_argument('--index', default=INDEX_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    now = commands.add_parser('now', help='show what is on now and next')
+    now.add_argument('channel')
+    now.add_argument('--at', help='ISO time to use instead of now')
+    between = commands.add_parser('range', help='show programmes in a time range')
+    between.add_argument('channel')
+    between.add_argument('--from', dest='start', required=True)
+    between.add_argument('--to', dest='stop', required=True)
+    commands.add_parser('channels', help='list indexed channels')
+    args = parser.parse_args()
+
+    index = ProgrammeIndex(args.index)
+    if args.command == 'channels':
+        for channel_id, name in index.channels().items():
+            print(f"{channel_id}\t{name}")
+    elif args.command == 'now':
+        current, upcoming = index.now_next(args.channel, _parse_time(args.at) if args.at else None)
+        print("Now: " + (_format_listing(current) if current else "-"))
+        print("Next: " + (_format_listing(upcoming) if upcoming else "-"))
+    else:
+        for listing in index.between(args.channel, _parse_time(args.start), _parse_time(args.stop)):
+            print(_format_listing(listing))
+
+if __name__ == "__main__":
+    main()
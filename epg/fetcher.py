@@ -0,0 +1,89 @@
+"""Concurrent fetch engine for the EPG sources."""
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Per-source outcome of fetch_all(): `data` is the job's return value when
+# `ok` is true, otherwise `error` holds a short description of what failed.
+FetchResult = namedtuple('FetchResult', ['source', 'ok', 'data', 'error', 'elapsed'])
+
+def create_session(headers=None, pool_size=16, retries=0, backoff=0.5):
+    """Return a requests session with a shared, pooled connection adapter.
+
+    With `retries`, connection errors and 429/5xx answers to GET requests are
+    retried with exponential backoff before the error reaches the caller.
+    """
+    session = requests.Session()
+    max_retries = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                        raise_on_status=False) if retries else 0
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+def fetch_all(jobs, max_workers=None, grace=1.0):
+    """Run every job at the same time and collect a FetchResult per source.
+
+    `jobs` maps a source name to a `(func, budget)` pair. Each func is called
+    without arguments and should raise on failure. A job that has not
+    finished `budget + grace` seconds after the batch started is reported
+    as failed, so the results are in after at most the largest budget plus
+    the grace period; a budget of None sets no deadline. The grace period
+    lets a job that hit its own request timeout still fall back on
+    something else.
+
+    The deadline does not stop the job itself: a thread cannot be
+    interrupted, so an overrunning job keeps going in the background until
+    its own request timeouts end it, and the interpreter waits for it
+    before exiting. Its work has to be bounded by those timeouts, as
+    fetch_budget() assumes, and whatever it still writes (the HTTP cache
+    replaces complete files only) must be safe to land after the batch.
+    """
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(jobs) or 1)
+    started = time.monotonic()
+    pending = {}
+    for source, (func, budget) in jobs.items():
+        future = executor.submit(_run_job, func)
+        pending[future] = (source, started + budget + grace if budget is not None else None)
+
+    try:
+        while pending:
+            now = time.monotonic()
+            for future, (source, deadline) in list(pending.items()):
+                if deadline is not None and not future.done() and deadline <= now:
+                    del pending[future]
+                    future.cancel()  # only stops a job that has not started yet
+                    results[source] = FetchResult(source, False, None, 'deadline exceeded', now - started)
+            if not pending:
+                break
+
+            deadlines = [deadline for _, deadline in pending.values() if deadline is not None]
+            timeout = max(min(deadlines) - now, 0) if deadlines else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                source, _ = pending.pop(future)
+                ok, value, elapsed = future.result()
+                if ok:
+                    results[source] = FetchResult(source, True, value, None, elapsed)
+                else:
+                    results[source] = FetchResult(source, False, None, value, elapsed)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return {source: results[source] for source in jobs}
+
+def _run_job(func):
+    """Call a job and turn its outcome into an (ok, value, elapsed) tuple."""
+    started = time.monotonic()
+    try:
+        value = func()
+    except Exception as e:
+        return False, f'{type(e).__name__}: {e}', time.monotonic() - started
+    return True, value, time.monotonic() - started
@@ -0,0 +1,175 @@
+"""On-disk HTTP cache with conditional (ETag/Last-Modified) revalidation."""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+MAX_AGE = 3 * 24 * 3600  # entries not checked for this long are dropped
+
+def _tmp_path(path):
+    """Return a temporary name for `path` that no other writer uses.
+
+    A fetch that overran its deadline may still be writing an entry when
+    the next run writes the same one.
+    """
+    return f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class CachedResponse:
+    """A response body stored on disk, with the same accessors as requests."""
+
+    def __init__(self, url, path, encoding=None, from_cache=False, stale=False, fetched_at=None):
+        self.url = url
+        self.path = path
+        self.encoding = encoding
+        self.from_cache = from_cache  # served after a 304 (or stale fallback)
+        self.stale = stale  # upstream failed and the cached copy was used
+        self.fetched_at = fetched_at  # when the body was downloaded (epoch)
+
+    def open(self):
+        """Open the body as a binary file."""
+        return open(self.path, 'rb')
+
+    @property
+    def content(self):
+        with self.open() as f:
+            return f.read()
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+class HTTPCache:
+    """Store raw responses and their validators under `directory`.
+
+    Requests for a URL that is already cached are sent with If-None-Match /
+    If-Modified-Since, and a 304 answer reuses the stored body. When the
+    upstream cannot be reached or answers 429/5xx, the last good copy is
+    returned and flagged as stale; its `fetched_at` tells how old it is,
+    which matters for pages whose content depends on the day they are
+    fetched.
+
+    URLs that embed dates (Shahid's window) change every day, so entries
+    that were not requested for `max_age` seconds are pruned when the
+    cache is opened.
+    """
+
+    def __init__(self, directory, max_age=MAX_AGE):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.pruned = self.prune(max_age) if max_age else 0
+
+    def prune(self, max_age):
+        """Remove the entries last checked more than `max_age` seconds ago; return how many."""
+        cutoff = time.time() - max_age
+        pruned = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            base, ext = os.path.splitext(path)
+            try:
+                if ext == '.json':
+                    try:
+                        with open(path, encoding='utf-8') as f:
+                            checked_at = json.load(f).get('checked_at') or 0
+                    except ValueError:
+                        checked_at = 0
+                    if checked_at < cutoff:
+                        _remove(base + '.body')
+                        _remove(path)
+                        pruned += 1
+                elif ext == '.body' and os.path.exists(base + '.json'):
+                    continue  # goes with its metadata
+                elif os.path.getmtime(path) < cutoff:
+                    # A body without metadata, or a download left unfinished
+                    _remove(path)
+            except FileNotFoundError:
+                continue  # removed along with its entry
+        return pruned
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:20]
+        base = os.path.join(self.directory, key)
+        return base + '.body', base + '.json'
+
+    def _load_meta(self, url):
+        body_path, meta_path = self._paths(url)
+        if not os.path.exists(body_path):
+            return None
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('url') == url else None
+
+    def _save_meta(self, url, meta):
+        _, meta_path = self._paths(url)
+        tmp_path = _tmp_path(meta_path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def get(self, session, url, timeout, headers=None):
+        """GET `url` through the cache and return a CachedResponse."""
+        body_path, _ = self._paths(url)
+        meta = self._load_meta(url)
+        request_headers = dict(headers or {})
+        if meta:
+            if meta.get('etag'):
+                request_headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                request_headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = (session or requests).get(url, headers=request_headers, timeout=timeout, stream=True)
+        except requests.RequestException:
+            if meta is None:
+                raise
+            return self._stale(url, meta)
+
+        with response:
+            if response.status_code == 304 and meta:
+                meta['checked_at'] = time.time()
+                self._save_meta(url, meta)
+                return CachedResponse(url, body_path, meta.get('encoding'), from_cache=True,
+                                      fetched_at=meta.get('fetched_at'))
+            # Sessions with retries hand back the last 429/5xx answer
+            # instead of raising; the upstream is down all the same
+            if meta and (response.status_code == 429 or response.status_code >= 500):
+                return self._stale(url, meta)
+
+            response.raise_for_status()
+            tmp_path = _tmp_path(body_path)
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_path, body_path)
+
+            now = time.time()
+            self._save_meta(url, {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'encoding': response.encoding,
+                'fetched_at': now,
+                'checked_at': now,
+            })
+            return CachedResponse(url, body_path, response.encoding, fetched_at=now)
+
+    def _stale(self, url, meta):
+        """Return the cached copy of `url` when the upstream failed."""
+        body_path, _ = self._paths(url)
+        return CachedResponse(url, body_path, meta.get('encoding'), from_cache=True, stale=True,
+                              fetched_at=meta.get('fetched_at'))
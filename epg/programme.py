@@ -0,0 +1,47 @@
+"""Provider-independent programme model.
+
+Every provider is normalised into Programme objects: the channel is the
+interned XMLTV channel id, start/stop are integer UTC epochs and repeated
+titles/descriptions share one string through a StringPool.
+"""
+import sys
+
+class Programme:
+    """A single guide entry."""
+    __slots__ = ('channel', 'start', 'stop', 'title', 'desc', 'icon')
+
+    def __init__(self, channel, start, stop, title, desc=None, icon=None):
+        self.channel = channel
+        self.start = start
+        self.stop = stop
+        self.title = title
+        self.desc = desc
+        self.icon = icon
+
+    def __repr__(self):
+        return f'Programme({self.channel!r}, {self.start}, {self.stop}, {self.title!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, Programme):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+class StringPool:
+    """Deduplicate repeated strings so each distinct value is stored once."""
+
+    def __init__(self):
+        self._strings = {}
+
+    def __call__(self, value):
+        if not value:
+            return value
+        return self._strings.setdefault(value, value)
+
+    def __len__(self):
+        return len(self._strings)
+
+def make_programme(pool, channel, start, stop, title, desc=None, icon=None):
+    """Build a Programme, interning the channel id and pooling its text."""
+    return Programme(sys.intern(channel), int(start), int(stop), pool(title or ''), pool(desc) or None, icon or None)
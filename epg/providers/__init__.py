@@ -0,0 +1,71 @@
+"""Registry of EPG providers.
+
+A provider is a module in this package that defines:
+
+- NAME, plus its own TIMEOUT (seconds per request), RETRIES and
+  CONCURRENCY (parallel requests it may make)
+- fetch(session, timeout, cache): download the raw guide, raising on failure;
+  providers whose API takes a date range also set WINDOW = True and accept
+  `days`, the number of days of guide to request
+- get_channel_map(): {provider channel id: {'name': ..., 'tvg_id': ...}}
+- parse(data, channel_map, pool): yield Programme objects from fetch()'s result;
+  the generator passes a channel map keyed by channel_index.id_key(), so
+  provider ids are looked up case-insensitively
+
+Every run loads every provider module, as the channel index is built from
+all of their channel maps, even when only some of them are fetched.
+Adding a source means adding a module and a line to PROVIDERS.
+"""
+import importlib
+
+from fetcher import create_session
+from providers.base import EPG_DAYS, HEADERS
+
+PROVIDERS = {
+    'shahid': 'providers.shahid',
+    'adtv': 'providers.adtv',
+    'alkass': 'providers.alkass',
+    'atlaspro': 'providers.atlaspro',
+}
+# Which source keeps the slot when channels' schedules overlap: the
+# broadcasters' own guides before the aggregated AtlasPro feed
+PRIORITY = ('shahid', 'adtv', 'alkass', 'atlaspro')
+RETRY_BACKOFF = 0.5
+
+def load_provider(name):
+    """Import and return the provider module registered as `name`."""
+    try:
+        module = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"unknown EPG provider: {name}") from None
+    return importlib.import_module(module)
+
+def fetch_budget(provider):
+    """Return how long a provider may take including its retries and backoff."""
+    backoff = sum(RETRY_BACKOFF * 2 ** attempt for attempt in range(provider.RETRIES))
+    return provider.TIMEOUT * (provider.RETRIES + 1) + backoff
+
+def provider_session(provider):
+    """Return a session for `provider` alone.
+
+    Each provider gets a connection pool sized to its concurrency budget and
+    its own retry policy, so a slow or failing source cannot hold up the
+    connections or the deadline of the others.
+    """
+    return create_session(HEADERS, pool_size=provider.CONCURRENCY, retries=provider.RETRIES,
+                          backoff=RETRY_BACKOFF)
+
+def fetch_job(provider, cache=None, session=None, days=EPG_DAYS):
+    """Return a fetch_all() job that runs `provider` on its own session.
+
+    A `session` from provider_session() can be passed in to keep its
+    connections warm across runs; otherwise a new one is created. `days`
+    is passed on to providers that take a window.
+    """
+    session = session or provider_session(provider)
+
+    def job():
+        if getattr(provider, 'WINDOW', False):
+            return provider.fetch(session, provider.TIMEOUT, cache, days=days)
+        return provider.fetch(session, provider.TIMEOUT, cache)
+    return job, fetch_budget(provider)
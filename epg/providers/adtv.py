@@ -0,0 +1,61 @@
+"""Abu Dhabi Media channels from the ADTV programme API."""
+from collections import Counter
+
+from channel_index import id_key
+from programme import StringPool, make_programme
+from providers.base import count_rejected, http_get
+from timeutil import millis_to_epoch, to_epochs
+
+NAME = 'adtv'
+TIMEOUT = 10
+RETRIES = 2
+CONCURRENCY = 1
+ADTV_URL = 'https://adtv.ae/api/biz/program/list'
+
+def fetch(session=None, timeout=TIMEOUT, cache=None):
+    """Fetch ADTV EPG data."""
+    return http_get(session, ADTV_URL, timeout, cache, source=NAME).json()
+
+def get_channel_map():
+    """Return ADTV channel mapping."""
+    return {
+        'Abu Dhabi Channel': {'name': 'Abu Dhabi TV', 'tvg_id': 'AbuDhabiTV.ae'},
+        'Emirates Channel': {'name': 'Al Emarat TV', 'tvg_id': 'EmiratesTV.ae'},
+        'Baynounah': {'name': 'Baynounah TV', 'tvg_id': 'BaynounahTV.ae'},
+        'National Geographic HD Channel': {'name': 'National Geographic Abu Dhabi', 'tvg_id': 'NationalGeographicAbuDhabi.ae'},
+        'Majid Children Channel': {'name': 'Majid TV', 'tvg_id': 'MajidTV.ae'},
+        'Abu Dhabi Sports Channel 1': {'name': 'Abu Dhabi Sports 1', 'tvg_id': 'AbuDhabiSports1.ae'},
+        'Abu Dhabi Sports Channel 2': {'name': 'Abu Dhabi Sports 2', 'tvg_id': 'AbuDhabiSports2.ae'},
+        'YAS Sports Channel': {'name': 'Yas TV', 'tvg_id': 'YasTV.ae'}
+    }
+
+def parse(data, channel_map, pool=None):
+    """Yield ADTV programmes as Programme objects."""
+    if 'response' not in data:
+        return
+    pool = pool or StringPool()
+    rejected = Counter()
+    try:
+        for channel_data in data['response']:
+            channel_id = channel_data.get('channelExternalId')
+            channel_info = channel_map.get(id_key(channel_id))
+            if channel_info is None:
+                rejected[channel_id, 'unmapped_channel'] += len(channel_data.get('programs', []))
+                continue
+                
+            tvg_id = channel_info['tvg_id']
+            
+            programs = channel_data.get('programs', [])
+            # ADTV times are epoch milliseconds
+            starts = to_epochs([program.get('startDate') for program in programs], millis_to_epoch)
+            stops = to_epochs([program.get('endDate') for program in programs], millis_to_epoch)
+            
+            for program, start, stop in zip(programs, starts, stops):
+                if start is None or stop is None:
+                    rejected[tvg_id, 'bad_time'] += 1
+                    continue
+                
+                yield make_programme(pool, tvg_id, start, stop, program.get('name', ''),
+                                     desc=program.get('description'))
+    finally:
+        count_rejected(NAME, rejected)
@@ -0,0 +1,285 @@
+"""Alkass sports channels, scraped from the alkass.net TV guide pages."""
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import partial
+from html.parser import HTMLParser
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+from channel_index import id_key
+from fetcher import fetch_all
+from programme import StringPool, make_programme
+from providers.base import count_rejected, http_get
+from timeutil import local_midnight, timezone
+
+NAME = 'alkass'
+TIMEOUT = 10
+RETRIES = 2
+CONCURRENCY = 2  # today and tomorrow are separate pages
+ALKASS_URL = 'https://www.alkass.net/tvguide'
+QATAR_TZ = timezone('Asia/Qatar')
+CHANNEL_NAMES = ['one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'online']
+LIST_IDS = [f'cg{i}' for i in range(1, len(CHANNEL_NAMES) + 1)]  # one <ul> per channel
+CELL_CLASSES = [('time', 'tv-prog-time'), ('name', 'tv-prog-name')]
+
+class _GuideParser(HTMLParser):
+    """Collect the (time, name) cells of the cg1..cg9 lists in one pass.
+
+    Everything outside those lists is skipped without building a tree.
+    Cell text is stripped piece by piece and joined, like BeautifulSoup's
+    get_text(strip=True).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lists = {}
+        self._rows = None  # rows of the list being read
+        self._depth = 0  # <ul> nesting inside that list
+        self._row = None  # {'time': [...], 'name': [...]} for the current <tr>
+        self._cell = None  # text pieces of the current wanted <td>
+
+    def handle_starttag(self, tag, attrs):
+        if self._rows is None:
+            if tag == 'ul':
+                list_id = dict(attrs).get('id')
+                if list_id in LIST_IDS and list_id not in self.lists:
+                    self._rows = self.lists[list_id] = []
+                    self._depth = 1
+            return
+        if tag == 'ul':
+            self._depth += 1
+        elif tag == 'tr':
+            self._finish_row()
+            self._row = {}
+        elif tag == 'td' and self._row is not None:
+            classes = (dict(attrs).get('class') or '').split()
+            self._cell = None
+            for key, cls in CELL_CLASSES:
+                if cls in classes and key not in self._row:
+                    self._cell = self._row[key] = []
+                    break
+
+    def handle_endtag(self, tag):
+        if self._rows is None:
+            return
+        if tag == 'td':
+            self._cell = None
+        elif tag == 'tr':
+            self._finish_row()
+        elif tag == 'ul':
+            self._depth -= 1
+            if self._depth == 0:
+                self._finish_row()
+                self._rows = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            text = data.strip()
+            if text:
+                self._cell.append(text)
+
+    def _finish_row(self):
+        if self._row and 'time' in self._row and 'name' in self._row:
+            self._rows.append((''.join(self._row['time']), ''.join(self._row['name'])))
+        self._row = None
+        self._cell = None
+
+def extract_htmlparser(text):
+    """Return {list id: [(time, name), ...]} using the targeted stdlib parser."""
+    parser = _GuideParser()
+    parser.feed(text)
+    parser.close()
+    return parser.lists
+
+def _first_cell(row, cls):
+    for cell in row.iter('td'):
+        if cls in (cell.get('class') or '').split():
+            return cell
+    return None
+
+def extract_lxml(text):
+    """Return {list id: [(time, name), ...]} using lxml's C HTML parser."""
+    lists = {}
+    for ul in lxml.html.fromstring(text).iter('ul'):
+        list_id = ul.get('id')
+        if list_id not in LIST_IDS or list_id in lists:
+            continue
+        rows = lists[list_id] = []
+        for row in ul.iter('tr'):
+            time_cell = _first_cell(row, 'tv-prog-time')
+            name_cell = _first_cell(row, 'tv-prog-name')
+            if time_cell is not None and name_cell is not None:
+                rows.append((''.join(t.strip() for t in time_cell.itertext()),
+                             ''.join(t.strip() for t in name_cell.itertext())))
+    return lists
+
+def extract_bs4(text):
+    """Return {list id: [(time, name), ...]} the original way, with BeautifulSoup."""
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(text, 'html.parser')
+    lists = {}
+    for list_id in LIST_IDS:
+        channel_div = soup.find('ul', id=list_id)
+        if not channel_div:
+            continue
+        rows = lists[list_id] = []
+        for program in channel_div.find_all('tr'):
+            time_cell = program.find('td', class_='tv-prog-time')
+            name_cell = program.find('td', class_='tv-prog-name')
+            if time_cell and name_cell:
+                rows.append((time_cell.get_text(strip=True), name_cell.get_text(strip=True)))
+    return lists
+
+def extract_lists(text):
+    """Extract the guide lists with the fastest engine available.
+
+    BeautifulSoup is only used if the fast path finds none of the lists,
+    e.g. because the markup is too broken for it.
+    """
+    lists = (extract_lxml if lxml is not None else extract_htmlparser)(text)
+    return lists or extract_bs4(text)
+
+def day_start(day, now=None):
+    """Return the epoch of midnight in Qatar on `day` ('today' or 'next')."""
+    date = (now or datetime.now(QATAR_TZ)).date()
+    if day == 'next':
+        date += timedelta(days=1)
+    return local_midnight(QATAR_TZ, date)
+
+def fetch_alkass_day_data(day, session=None, timeout=TIMEOUT, cache=None, now=None):
+    """Fetch AlKass EPG data for a specific day as (start epoch, title) pairs per channel.
+
+    The pages are relative to the current day ("today", "?day=next"), so a
+    cached copy kept from another day is refused when the site is down
+    rather than being published under the wrong date.
+    """
+    url = ALKASS_URL + ("?day=next" if day == 'next' else "")
+    
+    response = http_get(session, url, timeout, cache, source=NAME)
+    if getattr(response, 'stale', False):
+        today = (now or datetime.now(QATAR_TZ)).date()
+        fetched = datetime.fromtimestamp(response.fetched_at or 0, QATAR_TZ).date()
+        if fetched != today:
+            raise RuntimeError(f"{url} is unreachable and the cached copy is from {fetched}")
+    return parse_day_page(response.text, day, now)
+
+def parse_day_page(text, day, now=None):
+    """Turn one tvguide page into {channel key: [(start epoch, title), ...]}."""
+    lists = extract_lists(text)
+    # Qatar has no DST, so a time of day is a fixed offset from midnight
+    midnight = day_start(day, now)
+    
+    data = {}
+    rejected = Counter()
+    for i, name in enumerate(CHANNEL_NAMES, 1):
+        channel_key = f'alkass_{name}'
+        data[channel_key] = []
+        
+        for time_str, title in lists.get(f'cg{i}', ()):
+            try:
+                hour, minute = map(int, time_str.split(':'))
+                if not (0 <= hour < 24 and 0 <= minute < 60):
+                    raise ValueError(time_str)
+            except ValueError:
+                rejected[channel_key, 'bad_time'] += 1
+                continue
+            data[channel_key].append((midnight + hour * 3600 + minute * 60, title))
+                    
+    count_rejected(NAME, rejected)
+    return data
+
+def combine_alkass_days(today_data, tomorrow_data):
+    """Merge the per-channel AlKass listings of two consecutive days."""
+    combined = {}
+    
+    for name in CHANNEL_NAMES:
+        channel_key = f'alkass_{name}'
+        combined[channel_key] = (today_data.get(channel_key, []) + 
+                                tomorrow_data.get(channel_key, []))
+    
+    return combined
+
+def fetch(session=None, timeout=TIMEOUT, cache=None):
+    """Fetch the AlKass guide for today and tomorrow.
+
+    Raises only if neither day could be fetched.
+    """
+    # Both pages are fetched and parsed at the same time, against one clock.
+    # They get no deadline of their own: each may use the session's retries,
+    # and the provider's fetch budget already bounds the whole of fetch().
+    now = datetime.now(QATAR_TZ)
+    results = fetch_all({
+        day: (partial(fetch_alkass_day_data, day, session, timeout, cache=cache, now=now), None)
+        for day in ('today', 'next')
+    }, max_workers=CONCURRENCY)
+    failed = [result for result in results.values() if not result.ok]
+    if len(failed) == len(results):
+        raise RuntimeError('; '.join(f"{result.source}: {result.error}" for result in failed))
+    for result in failed:
+        print(f"  alkass {result.source}: failed ({result.error})")
+    return combine_alkass_days(results['today'].data if results['today'].ok else {},
+                               results['next'].data if results['next'].ok else {})
+
+def get_channel_map():
+    """Return AlKass channel mapping."""
+    return {
+        'alkass_one': {
+            'name': 'Alkass One',
+            'tvg_id': 'AlkassOne.qa',
+        },
+        'alkass_two': {
+            'name': 'Alkass Two',
+            'tvg_id': 'AlkassTwo.qa',
+        },
+        'alkass_three': {
+            'name': 'Alkass Three',
+            'tvg_id': 'AlkassThree.qa',
+        },
+        'alkass_four': {
+            'name': 'Alkass Four',
+            'tvg_id': 'AlkassFour.qa',
+        },
+        'alkass_five': {
+            'name': 'Alkass Five',
+            'tvg_id': 'AlkassFive.qa',
+        },
+        'alkass_six': {
+            'name': 'Alkass Six',
+            'tvg_id': 'AlkassSix.qa',
+        },
+        'alkass_seven': {
+            'name': 'Alkass Seven',
+            'tvg_id': 'AlkassSeven.qa',
+        },
+        'alkass_eight': {
+            'name': 'Alkass Eight',
+            'tvg_id': 'AlkassEight.qa',
+        },
+        'alkass_online': {
+            'name': 'Alkass SHOOF',
+            'tvg_id': 'AlkassSHOOF.qa',
+        }
+    }
+
+def parse(data, channel_map, pool=None):
+    """Yield AlKass programmes as Programme objects.
+
+    The guide only lists start times, so each programme stops when the next
+    one starts and the last one of a channel is given an hour.
+    """
+    pool = pool or StringPool()
+    for channel_id, programmes in data.items():
+        channel_info = channel_map.get(id_key(channel_id))
+        if channel_info is None:
+            count_rejected(NAME, {(channel_id, 'unmapped_channel'): len(programmes)})
+            continue
+            
+        tvg_id = channel_info['tvg_id']
+        
+        for i, (start, title) in enumerate(programmes):
+            stop = programmes[i + 1][0] if i + 1 < len(programmes) else start + 3600
+            yield make_programme(pool, tvg_id, start, stop, title)
@@ -0,0 +1,151 @@
+"""French and international channels from the AtlasPro XMLTV feed."""
+import tempfile
+from collections import Counter
+import xml.etree.ElementTree as ET
+
+import requests
+
+import metrics
+
+from channel_index import id_key
+from programme import StringPool, make_programme
+from providers.base import HEADERS, count_rejected, http_get
+from timeutil import cached, xmltv_to_epoch
+
+NAME = 'atlaspro'
+TIMEOUT = 120  # the XMLTV feed can be hundreds of MB
+RETRIES = 1
+CONCURRENCY = 1
+ATLASPRO_URL = 'http://apbest.re/xmltv.php'
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 8 * 1024 * 1024
+
+def fetch(session=None, timeout=TIMEOUT, cache=None):
+    """Fetch AtlasPro EPG data.
+
+    The feed is downloaded in chunks to a spooled temporary file (or the
+    HTTP cache) and returned as an open binary file, so the document is
+    never held in memory as a whole.
+    """
+    if cache is not None:
+        return http_get(session, ATLASPRO_URL, timeout, cache, source=NAME).open()
+    
+    response = (session or requests).get(ATLASPRO_URL, headers=HEADERS, timeout=timeout, stream=True)
+    response.raise_for_status()
+    
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            body.write(chunk)
+    except:
+        body.close()
+        raise
+    finally:
+        response.close()
+    metrics.inc('epg_fetch_requests_total', provider=NAME, cache='off')
+    metrics.inc('epg_fetch_bytes', body.tell(), provider=NAME)
+    body.seek(0)
+    return body
+
+def get_channel_map():
+    """Return AtlasPro channel mapping."""
+    return {
+        # Channels from AtlasPro
+        'TF1.fr': {'name': 'TF1', 'tvg_id': 'TF1.fr'},
+        'TMC.fr': {'name': 'TMC', 'tvg_id': 'TMC.fr'},
+        'TFX.fr': {'name': 'TFX', 'tvg_id': 'TFX.fr'},
+        'LCI.fr': {'name': 'LCI', 'tvg_id': 'LCI.fr'},
+        'TF1SeriesFilms.fr': {'name': 'TF1 Séries Films', 'tvg_id': 'TF1SeriesFilms.fr'},
+        'ARTE.fr': {'name': 'Arte', 'tvg_id': 'ARTE.fr'},
+        'LEquipe.fr': {'name': 'L\'Équipe', 'tvg_id': 'LEquipe.fr'},
+
+        'france2.fr': {'name': 'France 2', 'tvg_id': 'France2.fr'},
+        'france3.fr': {'name': 'France 3', 'tvg_id': 'France3.fr'},
+        'france5.fr': {'name': 'France 5', 'tvg_id': 'France5.fr'},
+        'france4.fr': {'name': 'France 4', 'tvg_id': 'France4.fr'},
+        'M6.fr': {'name': 'M6', 'tvg_id': 'M6.fr'},
+        '6ter.fr': {'name': '6ter', 'tvg_id': '6ter.fr'},
+        'W9.fr': {'name': 'W9', 'tvg_id': 'W9.fr'},
+
+        'CanalPlus.fr': {'name': 'Canal+', 'tvg_id': 'CanalPlus.fr'},
+        'CNews.fr': {'name': 'CNews', 'tvg_id': 'CNews.fr'},
+        'CStar.fr': {'name': 'CStar', 'tvg_id': 'CStar.fr'},
+        'Cherie25.fr': {'name': 'Chérie 25', 'tvg_id': 'Cherie25.fr'},
+        'Gulli.fr': {'name': 'Gulli', 'tvg_id': 'Gulli.fr'},
+        
+        'rmcdecouverte.fr': {'name': 'RMC Découverte', 'tvg_id': 'RMCDecouverte.fr'},
+        'rmcstory.fr': {'name': 'RMC Story', 'tvg_id': 'RMCStory.fr'},
+        'bfmtv.fr': {'name': 'BFM TV', 'tvg_id': 'BFMTV.fr'},
+
+        'TV5MondeMaghrebOrient.fr': {'name': 'TV5Monde Maghreb-Orient', 'tvg_id': 'TV5MondeMaghrebOrient.fr'},
+        'TV5MondeInfo.fr': {'name': 'TV5Monde Info', 'tvg_id': 'TV5MondeInfo.fr'},
+        'TV5Style.fr': {'name': 'TV5Monde Style', 'tvg_id': 'TV5MondeStyle.fr'},
+        'Tivi5.fr': {'name': 'TiVi5Monde', 'tvg_id': 'TiVi5Monde.fr'},
+
+        'ViaGrandParis.fr': {'name': 'Le Figaro TV', 'tvg_id': 'LeFigaroTV.fr'},
+        'france24.fr': {'name': 'France 24 Français', 'tvg_id': 'France24.fr'},
+        'france24.uk': {'name': 'France 24 English', 'tvg_id': 'France24English.fr'},
+        'aljazeera.uk': {'name': 'Al Jazeera English', 'tvg_id': 'AlJazeeraEnglish.qa'},
+        'bbcarabiccanada.ca': {'name': 'BBC News Arabic', 'tvg_id': 'BBCNewsArabic.uk'},
+        'bbcnews.uk': {'name': 'BBC News English', 'tvg_id': 'BBCNews.uk'},
+        'skynews.uk': {'name': 'Sky News English', 'tvg_id': 'SkyNews.uk'},
+    }
+
+def parse(source, channel_map, pool=None):
+    """Yield AtlasPro programmes from an XMLTV file object, one at a time.
+
+    `channel_map` is keyed by id_key(), so feed ids match whatever their
+    case. Programmes whose channel is not in it are skipped before any
+    object is built, and parsed elements are released as soon as they have
+    been read so memory stays flat however large the feed is.
+    """
+    if source is None:
+        return
+    pool = pool or StringPool()
+    rejected = Counter()
+    resolved = {}  # feed channel id -> channel_map entry or None
+    # A programme's stop is usually the next one's start
+    to_epoch = cached(xmltv_to_epoch)
+    try:
+        context = ET.iterparse(source, events=('start', 'end'))
+        root = None
+        for event, elem in context:
+            if root is None:
+                root = elem
+                continue
+            if event != 'end' or elem.tag not in ('programme', 'channel'):
+                continue
+            
+            if elem.tag == 'programme':
+                channel_id = elem.get('channel')
+                # Feed ids repeat for every programme, resolve each one once
+                if channel_id not in resolved:
+                    resolved[channel_id] = channel_map.get(id_key(channel_id))
+                channel_info = resolved[channel_id]
+                if channel_info is None:
+                    rejected[channel_id, 'unmapped_channel'] += 1
+                else:
+                    start = to_epoch(elem.get('start'))
+                    stop = to_epoch(elem.get('stop'))
+                    if start is None or stop is None:
+                        rejected[channel_info['tvg_id'], 'bad_time'] += 1
+                    else:
+                        title = elem.find('title')
+                        desc = elem.find('desc')
+                        yield make_programme(
+                            pool,
+                            channel_info['tvg_id'],
+                            start,
+                            stop,
+                            title.text if title is not None else '',
+                            desc=desc.text if desc is not None else None,
+                            icon=channel_info.get('icon'),
+                        )
+            # Top-level elements are finished, drop them from the tree
+            root.clear()
+    except ET.ParseError as e:
+        print(f"AtlasPro feed is malformed, stopping early: {e}")
+        metrics.inc('epg_parse_errors_total', provider=NAME)
+    finally:
+        source.close()
+        count_rejected(NAME, rejected)
@@ -0,0 +1,50 @@
+"""Settings and helpers shared by the EPG providers."""
+import os
+
+import requests
+
+import metrics
+
+EPG_DAYS = 7  # days of guide requested from providers that support a window
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+def http_get(session, url, timeout, cache=None, source=None):
+    """GET `url`, going through the on-disk HTTP cache when one is given.
+
+    The size of the body is recorded against the `source` provider, as
+    epg_fetch_bytes when it was downloaded and as epg_cached_bytes when it
+    came from the cache (a 304 or a stale copy).
+    """
+    if cache is None:
+        response = (session or requests).get(url, headers=HEADERS, timeout=timeout)
+        response.raise_for_status()
+        metrics.inc('epg_fetch_requests_total', provider=source, cache='off')
+        metrics.inc('epg_fetch_bytes', len(response.content), provider=source)
+        return response
+    
+    response = cache.get(session, url, timeout, headers=HEADERS)
+    if response.stale:
+        print(f"  {url} is unreachable, reusing the cached copy")
+    status = 'stale' if response.stale else 'hit' if response.from_cache else 'miss'
+    metrics.inc('epg_fetch_requests_total', provider=source, cache=status)
+    size = os.path.getsize(response.path)
+    metrics.inc('epg_fetch_bytes' if status == 'miss' else 'epg_cached_bytes', size, provider=source)
+    return response
+
+def count_rejected(source, rejected):
+    """Record {(channel, reason): count} of programmes a provider dropped.
+
+    Programmes of unmapped channels are only counted per provider: feeds
+    like AtlasPro's carry thousands of channels nobody maps, and a series
+    for each of them would swamp the metrics.
+    """
+    unmapped = 0
+    for (channel, reason), count in rejected.items():
+        if reason == 'unmapped_channel':
+            unmapped += count
+        else:
+            metrics.inc('epg_programmes_rejected_total', count, provider=source, channel=channel, reason=reason)
+    if unmapped:
+        metrics.inc('epg_programmes_rejected_total', unmapped, provider=source, reason='unmapped_channel')
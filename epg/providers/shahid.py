@@ -0,0 +1,101 @@
+"""Shahid (MBC group) guide from the Shahid EPG API."""
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytz
+
+from channel_index import id_key
+from programme import StringPool, make_programme
+from providers.base import EPG_DAYS, count_rejected, http_get
+from timeutil import iso_to_epoch, to_epochs
+
+NAME = 'shahid'
+TIMEOUT = 10
+RETRIES = 2
+CONCURRENCY = 1
+WINDOW = True
+SHAHID_URL = 'https://api3.shahid.net/proxy/v2.1/shahid-epg-api/'
+
+def fetch(session=None, timeout=TIMEOUT, cache=None, days=EPG_DAYS):
+    """Fetch `days` days of Shahid EPG data, starting today."""
+    today = datetime.now(pytz.utc)
+    yesterday = today - timedelta(days=1)
+    last_day = today + timedelta(days=days - 1)
+    
+    shahid_from = yesterday.strftime('%Y-%m-%dT23:00:00.000Z')
+    shahid_to = last_day.strftime('%Y-%m-%dT22:59:59.999Z')
+    
+    shahid_channel_ids = '400924,400921,400917,387248,387251,49923122575716,387290,387937,400919,387293,387296,409387,387294,418308,986064,986069,387286,1003218,387288,862837,997605,1001845,999399,414449,409385,409390,989622'
+    url = f"{SHAHID_URL}?csvChannelIds={shahid_channel_ids}&language=en&from={shahid_from}&to={shahid_to}"
+    
+    return http_get(session, url, timeout, cache, source=NAME).json()
+
+def get_channel_map():
+    """Return Shahid channel mapping."""
+    return {
+        # Documentary Channels
+        '997605': {'name': 'Asharq Documentary', 'tvg_id': 'AsharqDocumentary.sa'},
+        '1001845': {'name': 'Asharq Discovery', 'tvg_id': 'AsharqDiscovery.sa'},
+        '999399': {'name': 'Nature Time', 'tvg_id': 'NatureTime.sa'},
+        # MBC Channels
+        '387248': {'name': 'MBC1', 'tvg_id': 'MBC1.sa'},
+        '400917': {'name': 'MBC2', 'tvg_id': 'MBC2.sa'},
+        '409385': {'name': 'MBC3', 'tvg_id': 'MBC3.sa'},
+        '400919': {'name': 'MBC4', 'tvg_id': 'MBC4.sa'},
+        '387937': {'name': 'MBC5', 'tvg_id': 'MBC5.sa'},
+        '400921': {'name': 'MBC Action', 'tvg_id': 'MBCAction.sa'},
+        '400924': {'name': 'MBC Max', 'tvg_id': 'MBCMax.sa'},
+        '387251': {'name': 'MBC Drama', 'tvg_id': 'MBCDrama.sa'},
+        '387296': {'name': 'MBC+ Drama', 'tvg_id': 'MBCPlusDrama.sa'},
+        '49923122575716': {'name': 'MBC Masr Drama', 'tvg_id': 'MBCMasrDrama.sa'},
+        '387290': {'name': 'MBC Masr', 'tvg_id': 'MBCMasr.sa'},
+        '387293': {'name': 'MBC Masr 2', 'tvg_id': 'MBCMasr2.sa'},
+        '387294': {'name': 'MBC Iraq', 'tvg_id': 'MBCIraq.sa'},
+        '409387': {'name': 'MBC Bollywood', 'tvg_id': 'MBCBollywood.sa'},
+        '418308': {'name': 'MBC Persia', 'tvg_id': 'MBCPersia.sa'},
+        '414449': {'name': 'Wanasah', 'tvg_id': 'Wanasah.sa'},
+        # Movies Channels
+        '986064': {'name': 'Movies Action', 'tvg_id': 'MoviesAction.sa'},
+        '986069': {'name': 'Movies Thriller', 'tvg_id': 'MoviesThriller.sa'},
+        '989622': {'name': 'Aflam', 'tvg_id': 'Aflam.sa'},
+        # News Channels
+        '387286': {'name': 'Al Arabiya', 'tvg_id': 'AlArabiya.sa'},
+        '1003218': {'name': 'Al Arabiya Business', 'tvg_id': 'AlArabiyaBusiness.sa'},
+        '387288': {'name': 'Al Hadath', 'tvg_id': 'AlHadath.sa'},
+        '862837': {'name': 'Asharq News', 'tvg_id': 'AsharqNews.sa'},
+        # Kids Channels
+        '409390': {'name': 'Spacetoon', 'tvg_id': 'Spacetoon.sa'},
+    }
+
+def parse(data, channel_map, pool=None):
+    """Yield Shahid programmes as Programme objects."""
+    if 'items' not in data:
+        return
+    pool = pool or StringPool()
+    rejected = Counter()
+    try:
+        for channel_data in data['items']:
+            channel_id = channel_data.get('channelId')
+            channel_info = channel_map.get(id_key(channel_id))
+            if channel_info is None:
+                rejected[channel_id, 'unmapped_channel'] += len(channel_data.get('items', []))
+                continue
+                
+            tvg_id = channel_info['tvg_id']
+            programs = channel_data.get('items', [])
+            # Shahid times are ISO 8601 UTC ('Z'), converted for the whole channel at once
+            starts = to_epochs([program.get('from') for program in programs], iso_to_epoch)
+            stops = to_epochs([program.get('to') for program in programs], iso_to_epoch)
+            
+            for program, start, stop in zip(programs, starts, stops):
+                if program.get('emptySlot'):
+                    rejected[tvg_id, 'empty_slot'] += 1
+                    continue
+                if start is None or stop is None:
+                    rejected[tvg_id, 'bad_time'] += 1
+                    continue
+                
+                yield make_programme(pool, tvg_id, start, stop, program.get('title', ''),
+                                     desc=program.get('description'))
+    finally:
+        count_rejected(NAME, rejected)
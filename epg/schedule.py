@@ -0,0 +1,107 @@
+"""Repair of merged multi-source schedules before they are written.
+
+The store keeps every source's programmes side by side, so a channel fed
+by several providers (or by one provider under two spellings) can end up
+with the same programme twice, programmes that overlap, or holes between
+them. Each channel's programmes are walked once, in start order:
+
+- programmes starting at the same time as one already kept are duplicates
+  of it unless they run longer, in which case only their tail is kept
+- overlaps are clipped so the programme from the preferred source keeps
+  its slot, and the other one keeps whatever lies outside it, including
+  the part after it; within one source, a programme ends when the next
+  one starts (the stop times of guides that only list starts are guesses)
+- gaps up to `fill_gaps` seconds are closed by extending the programme
+  before them
+
+The sort is O(n log n) per channel (close to linear, as the store already
+returns programmes in start order) and the walk itself is linear, apart
+from the ends of clipped programmes, which go through a small heap to be
+put back in start order.
+"""
+import heapq
+from collections import Counter
+from itertools import groupby
+
+from programme import Programme
+
+FIXES = ('duplicate', 'clipped', 'dropped', 'gap_filled')
+
+def _with_times(programme, start, stop):
+    return Programme(programme.channel, start, stop, programme.title, programme.desc, programme.icon)
+
+def normalise_channel(programmes, rank, fill_gaps=0, fixes=None):
+    """Return one channel's [(source, Programme), ...] as a clean schedule.
+
+    `rank(source)` orders sources, lower being preferred. Counts of what
+    was repaired are added to the `fixes` Counter.
+    """
+    fixes = Counter() if fixes is None else fixes
+    ordered = sorted((programme.start, rank(source), n, programme)
+                     for n, (source, programme) in enumerate(programmes))
+    tails = []  # heap of the parts of programmes that outlast a preferred one overlapping them
+    seq = len(ordered)
+    kept = []  # [(rank, Programme)], sorted and never overlapping
+    i = 0
+    while i < len(ordered) or tails:
+        if tails and (i == len(ordered) or tails[0] < ordered[i]):
+            start, priority, _, programme = heapq.heappop(tails)
+        else:
+            start, priority, _, programme = ordered[i]
+            i += 1
+        stop = programme.stop
+        if stop <= start:
+            fixes['dropped'] += 1
+            continue
+        while kept and kept[-1][1].stop > start:
+            previous_priority, previous = kept[-1]
+            if previous_priority < priority or (previous_priority == priority and previous.start == start):
+                # The kept programme wins its slot, this one keeps the rest
+                if previous.start == start and previous.stop >= stop:
+                    fixes['duplicate'] += 1
+                elif previous.stop >= stop:
+                    fixes['dropped'] += 1
+                else:
+                    fixes['clipped'] += 1
+                start = previous.stop
+                break
+            # This one wins: cut the kept programme short, or drop it if
+            # nothing is left of it. A less preferred programme that runs
+            # on after this one also keeps its end, which other programmes
+            # may still overlap; within one source, this one ends it.
+            kept.pop()
+            if previous_priority > priority and previous.stop > stop:
+                heapq.heappush(tails, (stop, previous_priority, seq, _with_times(previous, stop, previous.stop)))
+                seq += 1
+                if previous.start < start:
+                    kept.append((previous_priority, _with_times(previous, previous.start, start)))
+                fixes['clipped'] += 1
+            elif previous.start < start:
+                kept.append((previous_priority, _with_times(previous, previous.start, start)))
+                fixes['clipped'] += 1
+            else:
+                fixes['dropped'] += 1
+        if start >= stop:
+            continue
+        if kept and 0 < start - kept[-1][1].stop <= fill_gaps:
+            previous_priority, previous = kept.pop()
+            kept.append((previous_priority, _with_times(previous, previous.start, start)))
+            fixes['gap_filled'] += 1
+        if start != programme.start:
+            programme = _with_times(programme, start, stop)
+        kept.append((priority, programme))
+    return [programme for _, programme in kept]
+
+def normalise_schedules(programmes, priority=(), fill_gaps=0, fixes=None):
+    """Yield the programmes of [(source, Programme), ...] grouped by channel, repaired.
+
+    The input must be ordered by channel, as ProgrammeStore.iter_programmes
+    returns it. Sources are preferred in `priority` order, unlisted ones
+    after all listed ones.
+    """
+    ranks = {source: n for n, source in enumerate(priority)}
+
+    def rank(source):
+        return ranks.get(source, len(ranks))
+    for _, channel_programmes in groupby(programmes, key=lambda item: item[1].channel):
+        yield from normalise_channel(channel_programmes, rank, fill_gaps, fixes)
@@ -0,0 +1,130 @@
+"""Persistent programme store for incremental EPG refreshes.
+
+Each run merges what the providers returned into the store instead of
+starting from scratch: unchanged channels are skipped by fingerprint, and
+for changed ones only the slots that were added, modified or removed
+inside the freshly fetched time window are written. Programmes that have
+ended are expired, and everything else (earlier fetched days, days a
+provider did not return this time) is kept.
+"""
+import hashlib
+import os
+import sqlite3
+from collections import namedtuple
+
+from programme import Programme
+
+MergeStats = namedtuple('MergeStats', ['channels', 'unchanged', 'added', 'changed', 'removed'])
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS programmes (
+    source TEXT, channel TEXT, start INTEGER, stop INTEGER, title TEXT, desc TEXT, icon TEXT,
+    PRIMARY KEY (source, channel, start)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS programmes_channel_start ON programmes (channel, start);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    source TEXT, channel TEXT, digest TEXT,
+    PRIMARY KEY (source, channel)
+) WITHOUT ROWID;
+'''
+
+def fingerprint(programmes):
+    """Return a digest of a channel's programme list."""
+    digest = hashlib.sha1()
+    for p in programmes:
+        digest.update(f'{p.start}\x1f{p.stop}\x1f{p.title}\x1f{p.desc}\x1f{p.icon}\x1e'.encode('utf-8'))
+    return digest.hexdigest()
+
+class ProgrammeStore:
+    """SQLite-backed store of programmes keyed by (source, channel, start)."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def merge(self, source, programmes):
+        """Merge one provider's programmes into the store and return MergeStats."""
+        by_channel = {}
+        for programme in programmes:
+            by_channel.setdefault(programme.channel, []).append(programme)
+
+        unchanged = added = changed = removed = 0
+        for channel, batch in by_channel.items():
+            batch.sort(key=lambda p: p.start)
+            digest = fingerprint(batch)
+            row = self._conn.execute('SELECT digest FROM fingerprints WHERE source = ? AND channel = ?',
+                                     (source, channel)).fetchone()
+            if row and row[0] == digest:
+                unchanged += 1
+                continue
+
+            a, c, r = self._merge_channel(source, channel, batch)
+            added += a
+            changed += c
+            removed += r
+            self._conn.execute('INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)', (source, channel, digest))
+        return MergeStats(len(by_channel), unchanged, added, changed, removed)
+
+    def _merge_channel(self, source, channel, batch):
+        """Apply the difference between `batch` and the stored slots it covers."""
+        window_start = batch[0].start
+        window_stop = max(p.stop for p in batch)
+        stored = {
+            row[0]: row[1:]
+            for row in self._conn.execute(
+                'SELECT start, stop, title, desc, icon FROM programmes '
+                'WHERE source = ? AND channel = ? AND start >= ? AND start < ?',
+                (source, channel, window_start, window_stop))
+        }
+
+        upserts = []
+        added = changed = 0
+        for p in batch:
+            values = (p.stop, p.title, p.desc, p.icon)
+            previous = stored.pop(p.start, None)
+            if previous is None:
+                added += 1
+            elif previous != values:
+                changed += 1
+            else:
+                continue
+            upserts.append((source, channel, p.start) + values)
+
+        self._conn.executemany('INSERT OR REPLACE INTO programmes VALUES (?, ?, ?, ?, ?, ?, ?)', upserts)
+        self._conn.executemany('DELETE FROM programmes WHERE source = ? AND channel = ? AND start = ?',
+                               [(source, channel, start) for start in stored])
+        return added, changed, len(stored)
+
+    def expire(self, before):
+        """Drop programmes that stopped before `before`; return how many."""
+        return self._conn.execute('DELETE FROM programmes WHERE stop <= ?', (before,)).rowcount
+
+    def iter_programmes(self, with_source=False):
+        """Yield every stored Programme ordered by channel and start time.
+
+        With `with_source`, yield (source, Programme) pairs instead.
+        """
+        rows = self._conn.execute(
+            'SELECT source, channel, start, stop, title, desc, icon FROM programmes ORDER BY channel, start, source')
+        for row in rows:
+            yield (row[0], Programme(*row[1:])) if with_source else Programme(*row[1:])
+
+    def commit(self):
+        self._conn.commit()
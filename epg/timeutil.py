@@ -0,0 +1,137 @@
+"""Timestamp normalisation shared by every provider.
+
+Providers hand their times over in whatever form their feed uses (ISO 8601
+strings, XMLTV strings, epoch milliseconds, local wall-clock times); these
+helpers turn them into integer UTC epochs, which is all the Programme
+model stores. XMLTV strings are only produced again by format_xmltv when
+the guide is written.
+
+Parsing slices the strings instead of going through strptime, and the
+parts that repeat across a guide (dates, offsets, time zones, whole
+timestamps since one programme's stop is the next one's start) are cached.
+Every converter returns None for a value it cannot read.
+"""
+import calendar
+import time
+from datetime import datetime, time as dt_time
+from functools import lru_cache
+
+import pytz
+
+CACHE_SIZE = 1 << 16
+
+@lru_cache(maxsize=None)
+def timezone(name):
+    """Return the pytz time zone called `name`, loaded once."""
+    return pytz.timezone(name)
+
+@lru_cache(maxsize=4096)
+def _date_epoch(year, month, day):
+    if not (1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]):
+        raise ValueError((year, month, day))
+    return calendar.timegm((year, month, day, 0, 0, 0))
+
+@lru_cache(maxsize=256)
+def _offset_seconds(offset):
+    """Seconds east of UTC for '', 'Z', '+HHMM' or '+HH:MM'."""
+    if offset in ('', 'Z', 'z'):
+        return 0
+    if offset[0] not in '+-':
+        raise ValueError(offset)
+    digits = offset[1:].replace(':', '')
+    if len(digits) not in (2, 4) or not digits.isdigit():
+        raise ValueError(offset)
+    seconds = int(digits[:2]) * 3600 + int(digits[2:] or 0) * 60
+    return -seconds if offset[0] == '-' else seconds
+
+def _time_of_day(hour, minute, second):
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 61):
+        raise ValueError((hour, minute, second))
+    return hour * 3600 + minute * 60 + second
+
+def iso_to_epoch(value):
+    """Convert an ISO 8601 `YYYY-mm-ddTHH:MM[:SS[.fff]][Z|+HH:MM]` time to a UTC epoch.
+
+    A missing offset is read as UTC; fractions of a second are dropped.
+    """
+    try:
+        epoch = _date_epoch(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+        if value[4] != '-' or value[7] != '-' or value[10] not in 'Tt ':
+            return None
+        rest = value[11:]
+        end = 5
+        second = 0
+        if rest[5:6] == ':':
+            second = int(rest[6:8])
+            end = 8
+            if rest[8:9] in ('.', ','):
+                end = 9
+                while rest[end:end + 1].isdigit():
+                    end += 1
+        if rest[2] != ':':
+            return None
+        epoch += _time_of_day(int(rest[0:2]), int(rest[3:5]), second)
+        return epoch - _offset_seconds(rest[end:])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def xmltv_to_epoch(value):
+    """Convert an XMLTV `YYYYmmddHHMMSS +ZZZZ` time to a UTC epoch.
+
+    A missing or empty offset is read as UTC.
+    """
+    try:
+        epoch = _date_epoch(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+        epoch += _time_of_day(int(value[8:10]), int(value[10:12]), int(value[12:14] or 0))
+        return epoch - _offset_seconds(value[14:].strip())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def millis_to_epoch(value):
+    """Convert epoch milliseconds to a UTC epoch."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return int(value // 1000)
+
+def local_midnight(tz, date):
+    """Return the UTC epoch of midnight on `date` in the pytz zone `tz`."""
+    return _local_midnight(tz.zone, date)
+
+@lru_cache(maxsize=256)
+def _local_midnight(zone, date):
+    return int(timezone(zone).localize(datetime.combine(date, dt_time())).timestamp())
+
+def cached(convert, maxsize=CACHE_SIZE):
+    """Return `convert` memoised for one run over a feed."""
+    return lru_cache(maxsize=maxsize)(convert)
+
+def to_epochs(values, convert):
+    """Convert a batch of provider timestamps with `convert`; None where invalid.
+
+    Values repeat a lot within a batch, so each distinct one is only
+    converted once.
+    """
+    seen = {}
+    epochs = []
+    for value in values:
+        try:
+            epoch = seen[value]
+        except KeyError:
+            epoch = seen[value] = convert(value)
+        except TypeError:  # unhashable, i.e. garbage in the feed
+            epoch = None
+        epochs.append(epoch)
+    return epochs
+
+@lru_cache(maxsize=1024)
+def _day_prefix(day):
+    return time.strftime('%Y%m%d', time.gmtime(day * 86400))
+
+@lru_cache(maxsize=86400)
+def _time_suffix(seconds):
+    return time.strftime('%H%M%S +0000', time.gmtime(seconds))
+
+def format_xmltv(epoch):
+    """Format a UTC epoch as an XMLTV `YYYYmmddHHMMSS +0000` time."""
+    day, seconds = divmod(epoch, 86400)
+    return _day_prefix(day) + _time_suffix(seconds)
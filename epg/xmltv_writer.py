@@ -0,0 +1,170 @@
+"""Incremental XMLTV writer.
+
+Elements are streamed to disk as soon as they are produced instead of being
+collected into an ElementTree first. The layout matches what
+`minidom.toprettyxml(indent="  ")` used to produce for the same document.
+"""
+import html
+import os
+import re
+from collections import Counter
+
+from timeutil import format_xmltv
+
+XML_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<!DOCTYPE tv SYSTEM "xmltv.dtd">\n'
+    '<!-- Generated with FennecSat.com EPG -->\n'
+)
+CHANNEL_KEY_RE = re.compile(r'<channel id="([^"]*)"')
+PROGRAMME_KEY_RE = re.compile(r'<programme start="([^"]*)".* channel="([^"]*)"')
+
+def escape(data):
+    """Escape text or attribute data the same way minidom does."""
+    if '\r' in data:
+        # The old ElementTree -> minidom round-trip normalised line endings.
+        data = data.replace('\r\n', '\n').replace('\r', '\n')
+    return (data.replace('&', '&amp;').replace('<', '&lt;')
+                .replace('"', '&quot;').replace('>', '&gt;'))
+
+def _attributes(attrs):
+    return ''.join(f' {name}="{escape(value)}"' for name, value in attrs)
+
+def _text_element(indent, tag, text):
+    if text:
+        return f'{indent}<{tag}>{escape(text)}</{tag}>\n'
+    return f'{indent}<{tag}/>\n'
+
+class XMLTVWriter:
+    """Write a `<tv>` document to `path` one channel/programme at a time.
+
+    The document is written to a temporary file next to `path` and only
+    moved into place once the writer is closed without an error. When
+    `expire_before` (a UTC epoch) is given, programmes that stopped before
+    it are dropped and counted in `expired`. Every channel and programme
+    that is written is also passed on to the `sinks`, which share the
+    write_channel/write_programme interface (e.g. the programme index).
+
+    `publish(tmp_path, path)` moves the finished document into place and
+    returns whether it did; e.g. publish.publish_changes skips documents
+    identical to the existing one. Whether the file was replaced ends up
+    in `changed`.
+    """
+
+    def __init__(self, path, attrs=(), buffering=1024 * 1024, expire_before=None, sinks=(), publish=None):
+        self.path = path
+        self.attrs = list(attrs.items()) if isinstance(attrs, dict) else list(attrs)
+        self.buffering = buffering
+        self.expire_before = expire_before
+        self.sinks = list(sinks)
+        self.publish = publish or _replace
+        self.expired = 0
+        self.changed = None
+        self._file = None
+        self._has_children = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self):
+        """Create the temporary file and write the document header."""
+        self._tmp_path = self.path + '.tmp'
+        self._file = open(self._tmp_path, 'w', encoding='utf-8', buffering=self.buffering)
+        self._file.write(XML_HEADER)
+        self._file.write('<tv' + _attributes(self.attrs))
+
+    def _write_child(self, data):
+        if not self._has_children:
+            self._file.write('>\n')
+            self._has_children = True
+        self._file.write(data)
+
+    def write_channel(self, channel_id, display_name):
+        """Write a `<channel>` element with its display name."""
+        for sink in self.sinks:
+            sink.write_channel(channel_id, display_name)
+        self._write_child(
+            f'  <channel id="{escape(channel_id)}">\n'
+            + _text_element('    ', 'display-name', display_name)
+            + '  </channel>\n'
+        )
+
+    def write_programme(self, programme):
+        """Write a `<programme>` element for a Programme.
+
+        Its `desc` and `icon` are left out when empty.
+        """
+        if self.expire_before is not None and programme.stop <= self.expire_before:
+            self.expired += 1
+            return
+        for sink in self.sinks:
+            sink.write_programme(programme)
+        parts = [
+            f'  <programme start="{format_xmltv(programme.start)}" stop="{format_xmltv(programme.stop)}" '
+            f'channel="{escape(programme.channel)}">\n',
+            _text_element('    ', 'title', programme.title),
+        ]
+        if programme.desc:
+            parts.append(_text_element('    ', 'desc', programme.desc))
+        if programme.icon:
+            parts.append(f'    <icon src="{escape(programme.icon)}"/>\n')
+        parts.append('  </programme>\n')
+        self._write_child(''.join(parts))
+
+    def close(self):
+        """Finish the document and move it over the destination path."""
+        if self._file is None:
+            return
+        self._file.write('</tv>\n' if self._has_children else '/>\n')
+        self._file.close()
+        self._file = None
+        self.changed = self.publish(self._tmp_path, self.path)
+
+    def abort(self):
+        """Discard the partially written document."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self._tmp_path)
+
+def _replace(tmp_path, path):
+    os.replace(tmp_path, path)
+    return True
+
+def read_records(path):
+    """Yield ('channel' or 'programme', key, text) for each element of a written document.
+
+    Channels are keyed by id and programmes by (channel, start), numbered
+    when a channel has several programmes starting at the same time. Only
+    the layout XMLTVWriter produces is understood.
+    """
+    seen = Counter()
+    with open(path, encoding='utf-8') as f:
+        lines = None
+        for line in f:
+            if lines is None:
+                if line.startswith('  <channel ') or line.startswith('  <programme '):
+                    lines = [line]
+                continue
+            lines.append(line)
+            if not line.startswith('  </'):
+                continue
+            text = ''.join(lines)
+            lines = None
+            match = CHANNEL_KEY_RE.match(text, 2)
+            if match:
+                yield 'channel', (html.unescape(match.group(1)),), text
+                continue
+            match = PROGRAMME_KEY_RE.match(text, 2)
+            if match:
+                key = (html.unescape(match.group(2)), match.group(1))
+                seen[key] += 1
+                yield 'programme', key + ((seen[key] - 1,) if seen[key] > 1 else ()), text
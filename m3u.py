@@ -0,0 +1,146 @@
+"""Streaming M3U playlist parser."""
+import re
+from collections import Counter
+
+ATTRIBUTE_RE = re.compile(r'([A-Za-z0-9_-]+)="([^"]*)"')
+DURATION_RE = re.compile(r'#EXTINF:\s*-?[0-9.]*')
+CHUNK_SIZE = 1024 * 1024
+ENTRY_MARKER = '\n#EXTINF'
+
+class M3UEntry:
+    """One `#EXTINF` entry, kept as the raw text it had in the playlist.
+
+    The `#EXTINF` attributes (tvg-id, tvg-name, tvg-logo, group-title, ...)
+    are parsed in a single regex pass the first time any of them is read;
+    reading only `group_title` does not need that pass.
+    """
+    __slots__ = ('text', '_attrs', '_name')
+
+    def __init__(self, text):
+        self.text = text
+        self._attrs = None
+        self._name = None
+
+    @property
+    def extinf(self):
+        end = self.text.find('\n')
+        return self.text if end == -1 else self.text[:end]
+
+    def _parse(self):
+        self._attrs, self._name = parse_extinf(self.extinf)
+
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._parse()
+        return self._attrs
+
+    @property
+    def name(self):
+        if self._attrs is None:
+            self._parse()
+        return self._name
+
+    @property
+    def tvg_id(self):
+        return self.attrs.get('tvg-id', '')
+
+    @property
+    def tvg_name(self):
+        return self.attrs.get('tvg-name', '')
+
+    @property
+    def tvg_logo(self):
+        return self.attrs.get('tvg-logo', '')
+
+    @property
+    def group_title(self):
+        if self._attrs is not None:
+            return self._attrs.get('group-title')
+        # Filtering only needs the group, so avoid a full parse of every entry
+        end = self.text.find('\n')
+        start = self.text.find(' group-title="', 0, end)
+        if start == -1:
+            return self.attrs.get('group-title')
+        start += len(' group-title="')
+        return self.text[start:self.text.find('"', start)]
+
+    @property
+    def url(self):
+        """The first non-directive line of the entry, if any."""
+        for line in self.text.split('\n')[1:]:
+            if line and not line.startswith('#'):
+                return line
+        return None
+
+    def with_url(self, url):
+        """Return a copy of the entry that points at another stream URL."""
+        old = self.url
+        if old is None:
+            return M3UEntry(self.text + url + '\n')
+        head, _, tail = self.text.partition('\n' + old)
+        return M3UEntry(head + '\n' + url + tail)
+
+    def with_attr(self, name, value):
+        """Return a copy of the entry with an `#EXTINF` attribute set to `value`."""
+        extinf = self.extinf
+        attr = re.compile(r'(?<=\s)%s="[^"]*"' % re.escape(name))
+        if attr.search(extinf):
+            line = attr.sub(lambda _: f'{name}="{value}"', extinf, count=1)
+        else:
+            # New attributes go right after the duration
+            end = DURATION_RE.match(extinf).end()
+            line = f'{extinf[:end]} {name}="{value}"{extinf[end:]}'
+        return M3UEntry(line + self.text[len(extinf):])
+
+    def to_m3u(self):
+        """Return the entry as it appeared in the playlist."""
+        return self.text
+
+def parse_extinf(line):
+    """Parse an `#EXTINF` line into its attribute dict and display name."""
+    attrs = dict(ATTRIBUTE_RE.findall(line))
+    # The display name follows the first comma after the last attribute
+    comma = line.find(',', line.rfind('"') + 1 if attrs else 0)
+    name = line[comma + 1:].strip() if comma != -1 else ''
+    return attrs, name
+
+def iter_entries(stream, chunk_size=CHUNK_SIZE):
+    """Yield an M3UEntry for every `#EXTINF` block of a text stream.
+
+    The stream is read `chunk_size` characters at a time and split on
+    entry boundaries, so memory use does not depend on the playlist size.
+    Everything before the first `#EXTINF` (the `#EXTM3U` header) is skipped.
+    """
+    # A leading newline lets an entry on the very first line match too
+    buffer = '\n'
+    in_entry = False  # whether `buffer` holds the tail of an entry
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        blocks = buffer.split(ENTRY_MARKER)
+        buffer = blocks.pop()
+        if not blocks:
+            continue
+        if not in_entry:
+            blocks = blocks[1:]
+            in_entry = True
+        for block in blocks:
+            yield M3UEntry('#EXTINF' + block + '\n')
+
+    if in_entry:
+        yield M3UEntry('#EXTINF' + buffer + ('' if buffer.endswith('\n') else '\n'))
+
+def read_records(path):
+    """Yield ('channel', key, text) for each entry of a playlist file.
+
+    Entries are keyed by stream URL, numbered when a URL appears more than once.
+    """
+    seen = Counter()
+    with open(path, encoding='utf-8') as f:
+        for entry in iter_entries(f):
+            url = entry.url or ''
+            seen[url] += 1
+            yield 'channel', (url,) + ((seen[url] - 1,) if seen[url] > 1 else ()), entry.to_m3u()
@@ -0,0 +1,173 @@
+"""Run metrics and profiling for the EPG and playlist pipelines.
+
+Instrumented code records into the module-level registry with inc(),
+gauge() and timer(); at the end of a run the registry is written out as a
+JSON file or, when the path ends in `.prom`, as a Prometheus textfile
+(for node_exporter's textfile collector).
+
+    python epg/epg_generator.py --metrics metrics/epg.prom
+    python source.py --metrics metrics/playlist.json --profile cprofile
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+PROFILE_TOP = 25
+
+class Metrics:
+    """Named samples keyed by their labels, safe to update from threads."""
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Add `value` to a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._samples.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        """Set a gauge."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._samples.setdefault(name, {})[key] = value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Record how long the block took, in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc(name, time.perf_counter() - started, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def to_dict(self):
+        """Return {metric: [{'labels': {...}, 'value': ...}, ...]}."""
+        with self._lock:
+            return {
+                name: [{'labels': dict(key), 'value': value} for key, value in sorted(series.items())]
+                for name, series in sorted(self._samples.items())
+            }
+
+    def to_prometheus(self):
+        """Return the samples in the Prometheus text exposition format."""
+        lines = []
+        for name, samples in self.to_dict().items():
+            lines.append(f'# TYPE {name} {"counter" if name.endswith("_total") else "gauge"}')
+            for sample in samples:
+                labels = ','.join(f'{key}="{_escape_label(value)}"' for key, value in sample['labels'].items())
+                lines.append(f'{name}{{{labels}}} {sample["value"]}' if labels else f'{name} {sample["value"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, **info):
+        """Write the samples to `path` atomically; `info` goes in the JSON header."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(dict(info, metrics=self.to_dict()), f, indent=2)
+        os.replace(path + '.tmp', path)
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+REGISTRY = Metrics()
+inc = REGISTRY.inc
+gauge = REGISTRY.gauge
+timer = REGISTRY.timer
+
+def peak_rss_bytes():
+    """Return the peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+@contextmanager
+def stage(pipeline, name):
+    """Time a pipeline stage and record how much it raised the process's peak RSS.
+
+    The peak only ever grows, so a stage that stays below what an earlier
+    one reached records 0; the process's own peak is `<pipeline>_peak_rss_bytes`.
+    """
+    before = peak_rss_bytes()
+    with REGISTRY.timer(f'{pipeline}_stage_seconds', stage=name):
+        yield
+    REGISTRY.gauge(f'{pipeline}_stage_rss_growth_bytes', peak_rss_bytes() - before, stage=name)
+
+@contextmanager
+def profiled(mode, name):
+    """Run the block under cProfile or tracemalloc and report the hot spots.
+
+    cProfile stats are saved to `<name>.prof` for later inspection with
+    pstats/snakeviz; tracemalloc prints the top allocation sites.
+    """
+    if mode is None:
+        yield
+        return
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f'{name}.prof')
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            print(out.getvalue())
+            print(f"Profile saved to {name}.prof")
+    elif mode == 'tracemalloc':
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            REGISTRY.gauge('tracemalloc_peak_bytes', peak)
+            print(f"Peak traced memory: {peak / 1024 / 1024:.1f} MB; largest allocation sites:")
+            for stat in snapshot.statistics('lineno')[:PROFILE_TOP]:
+                print(f"  {stat}")
+    else:
+        raise ValueError(f"unknown profile mode: {mode}")
+
+def add_arguments(parser):
+    """Add the --metrics and --profile options to a pipeline's argument parser."""
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='write run metrics as JSON, or as a Prometheus textfile if PATH ends in .prom')
+    parser.add_argument('--profile', choices=PROFILE_MODES, help='profile the run with cProfile or tracemalloc')
+
+def run(pipeline, func, args, *func_args):
+    """Call func(*func_args) with the profiling and metrics output `args` asks for."""
+    started = time.time()
+    ok = False
+    try:
+        with profiled(args.profile, pipeline):
+            result = func(*func_args)
+        ok = True
+        return result
+    finally:
+        REGISTRY.gauge(f'{pipeline}_run_seconds', time.time() - started)
+        REGISTRY.gauge(f'{pipeline}_run_success', int(ok))
+        REGISTRY.gauge(f'{pipeline}_last_run_timestamp_seconds', int(started))
+        REGISTRY.gauge(f'{pipeline}_peak_rss_bytes', peak_rss_bytes())
+        if args.metrics:
+            REGISTRY.write(args.metrics, pipeline=pipeline, started_at=int(started))
+            print(f"Metrics written to {args.metrics}")
@@ -0,0 +1,181 @@
+"""Check which playlist streams are alive and drop or replace the dead ones.
+
+    python probe.py playlist.m3u --mode slate --report health.json
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from m3u import iter_entries
+
+OFFLINE_URL = "https://raw.githubusercontent.com/fennecsat/iptv/main/assets/offline/stream-offline.m3u8"
+CONCURRENCY = 64
+PER_HOST = 8
+TIMEOUT = 5
+PEEK_BYTES = 1024
+STREAM_EXTENSIONS = ('.ts', '.m3u8')
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+class HostLimiter:
+    """Hand out one semaphore per host so no host gets more than `limit` probes at once."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.limit)
+            return self._semaphores[host]
+
+def looks_like_stream(url, head):
+    """Sanity-check the first bytes of a stream against its extension."""
+    path = urlsplit(url).path.lower()
+    if path.endswith('.m3u8'):
+        return head.lstrip().startswith(b'#EXTM3U')
+    if path.endswith('.ts'):
+        # MPEG-TS packets start with the 0x47 sync byte
+        return head[:1] == b'\x47'
+    return bool(head)
+
+def probe_url(session, url, timeout=TIMEOUT):
+    """Probe one stream URL and return its health record.
+
+    `.ts`/`.m3u8` streams are opened and their first bytes checked, anything
+    else gets a HEAD request (falling back to GET when HEAD is refused).
+    """
+    started = time.monotonic()
+    record = {'url': url, 'ok': False, 'status': None, 'latency_ms': None, 'error': None}
+    try:
+        peek = urlsplit(url).path.lower().endswith(STREAM_EXTENSIONS)
+        if not peek:
+            response = session.head(url, timeout=timeout, allow_redirects=True)
+            response.close()
+            peek = response.status_code in (405, 501)
+        if peek:
+            with session.get(url, timeout=timeout, stream=True) as response:
+                head = next(response.iter_content(PEEK_BYTES), b'') if response.ok else b''
+            if response.ok and not looks_like_stream(url, head):
+                record['error'] = 'unexpected content'
+        record['status'] = response.status_code
+        if not response.ok:
+            record['error'] = f'HTTP {response.status_code}'
+        record['ok'] = record['error'] is None
+    except requests.RequestException as e:
+        record['error'] = type(e).__name__
+    record['latency_ms'] = round((time.monotonic() - started) * 1000)
+    return record
+
+def interleave_by_host(urls):
+    """Order URLs round-robin across hosts so workers are not all stuck on one host."""
+    by_host = defaultdict(list)
+    for url in urls:
+        by_host[urlsplit(url).netloc].append(url)
+    queues = list(by_host.values())
+    ordered = []
+    for i in range(max((len(q) for q in queues), default=0)):
+        ordered.extend(q[i] for q in queues if i < len(q))
+    return ordered
+
+def probe_urls(urls, concurrency=CONCURRENCY, per_host=PER_HOST, timeout=TIMEOUT):
+    """Probe every distinct URL concurrently and return {url: record}."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=per_host)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    limiter = HostLimiter(per_host)
+
+    def probe(url):
+        with limiter(url):
+            return probe_url(session, url, timeout)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        records = executor.map(probe, interleave_by_host(set(urls)))
+        return {record['url']: record for record in records}
+
+def probe_playlist(entries, mode='slate', offline_url=OFFLINE_URL, **options):
+    """Probe a list of M3UEntry and return (kept entries, health report).
+
+    Dead channels are removed with `mode='drop'`, pointed at the offline
+    slate with `mode='slate'` and left untouched with `mode='keep'`.
+    """
+    started = time.monotonic()
+    records = probe_urls([e.url for e in entries if e.url], **options)
+
+    kept = []
+    channels = []
+    for entry in entries:
+        record = records.get(entry.url, {'ok': False, 'status': None, 'latency_ms': None, 'error': 'no url'})
+        channels.append({
+            'name': entry.name,
+            'tvg_id': entry.tvg_id,
+            'group': entry.group_title,
+            'url': entry.url,
+            'ok': record['ok'],
+            'status': record['status'],
+            'latency_ms': record['latency_ms'],
+            'error': record['error'],
+        })
+        if record['ok'] or mode == 'keep':
+            kept.append(entry)
+        elif mode == 'slate':
+            kept.append(entry.with_url(offline_url))
+
+    alive = sum(1 for c in channels if c['ok'])
+    report = {
+        'generated_at': int(time.time()),
+        'duration_s': round(time.monotonic() - started, 2),
+        'mode': mode,
+        'channels_checked': len(channels),
+        'alive': alive,
+        'dead': len(channels) - alive,
+        'channels': channels,
+    }
+    return kept, report
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe playlist streams and handle dead channels.")
+    parser.add_argument('playlist', nargs='?', default='playlist.m3u')
+    parser.add_argument('--output', help='where to write the checked playlist (default: in place)')
+    parser.add_argument('--report', default='health.json')
+    parser.add_argument('--mode', choices=['drop', 'slate', 'keep'], default='slate')
+    parser.add_argument('--offline-url', default=OFFLINE_URL)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--per-host', type=int, default=PER_HOST)
+    parser.add_argument('--timeout', type=float, default=TIMEOUT)
+    args = parser.parse_args()
+
+    with open(args.playlist, encoding='utf-8') as f:
+        entries = list(iter_entries(f))
+    kept, report = probe_playlist(entries, mode=args.mode, offline_url=args.offline_url,
+                                  concurrency=args.concurrency, per_host=args.per_host,
+                                  timeout=args.timeout)
+
+    output = args.output or args.playlist
+    with open(output + '.tmp', 'w', encoding='utf-8') as f:
+        f.write("#EXTM3U\n")
+        for entry in kept:
+            f.write(entry.to_m3u())
+    os.replace(output + '.tmp', output)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"Checked {report['channels_checked']} channels in {report['duration_s']}s: "
+          f"{report['alive']} alive, {report['dead']} dead ({args.mode})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Publishing of the generated artifacts: delta checks, diffs and compressed variants.
+
+A new file is only moved over the published one when its content
+changed, so unchanged runs leave the files, their mtimes and the git
+history alone. Next to every changed file goes `<file>.diff.json`: the
+records (channels, programmes, playlist entries) that were added,
+changed or removed, so mirrors can sync the delta instead of the file.
+
+Every file we publish (playlists, epg.xml) also gets a `.gz` and an `.xz`
+copy so clients can download a fraction of the bytes. The variants are
+built side by side in a process pool and each one is written under a
+temporary name and moved into place, so a reader never sees a partial file.
+Variants newer than their source are left alone.
+
+    python publish.py epg.xml
+    python publish.py --force playlist.m3u
+"""
+import argparse
+import filecmp
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+FORMATS = ('gz', 'xz')
+CHUNK_SIZE = 1024 * 1024
+# xz -6 spent seconds on the playlists, several times longer than
+# producing them; -3 is ~10x faster for ~25% more bytes, still half the .gz
+XZ_PRESET = 3
+DIFF_SUFFIX = '.diff.json'
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def diff_records(old_path, new_path, read_records):
+    """Compare two files record by record.
+
+    `read_records(path)` yields (kind, key, text) for every record of a
+    file, keys being tuples unique within their kind. Returns
+    {kind: {'added': [...], 'changed': [...], 'removed': [...]}}, where
+    added and changed records carry their new text.
+    """
+    old = {}
+    if os.path.exists(old_path):
+        for kind, key, text in read_records(old_path):
+            old[kind, key] = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    changes = {}
+    for kind, key, text in read_records(new_path):
+        digest = old.pop((kind, key), None)
+        if digest == hashlib.blake2b(text.encode(), digest_size=16).digest():
+            continue
+        change = 'added' if digest is None else 'changed'
+        _changes(changes, kind)[change].append({'key': list(key), 'text': text})
+    for kind, key in old:
+        _changes(changes, kind)['removed'].append({'key': list(key)})
+    return changes
+
+def _changes(changes, kind):
+    return changes.setdefault(kind, {'added': [], 'changed': [], 'removed': []})
+
+def publish_changes(tmp_path, path, read_records=None):
+    """Move `tmp_path` over `path` unless both have the same content.
+
+    Returns whether `path` was replaced. With `read_records` (see
+    diff_records), the changes are also written to `path`.diff.json; when
+    there was no previous file they are null, meaning "fetch it all".
+    """
+    if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+        return False
+    if read_records is not None:
+        previous = file_sha256(path) if os.path.exists(path) else None
+        diff = {
+            'file': os.path.basename(path),
+            'generated_at': int(time.time()),
+            'previous_sha256': previous,
+            'sha256': file_sha256(tmp_path),
+            'changes': diff_records(path, tmp_path, read_records) if previous else None,
+        }
+        diff_path = path + DIFF_SUFFIX
+        with open(diff_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(diff, f, indent=1, ensure_ascii=False)
+            f.write('\n')
+        os.replace(diff_path + '.tmp', diff_path)
+    os.replace(tmp_path, path)
+    return True
+
+def _open_compressed(raw, fmt):
+    if fmt == 'gz':
+        # A fixed mtime and no file name keep the output byte-identical
+        # when the input has not changed
+        return gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=9, mtime=0)
+    if fmt == 'xz':
+        return lzma.open(raw, 'wb', preset=XZ_PRESET)
+    raise ValueError(f"unknown compression format: {fmt}")
+
+def up_to_date(path, fmt):
+    """Return whether `path`.`fmt` exists and is not older than `path`."""
+    target = f'{path}.{fmt}'
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path)
+
+def compress_file(path, fmt):
+    """Write `path`.`fmt` next to `path` atomically and return its name."""
+    target = f'{path}.{fmt}'
+    tmp_path = target + '.tmp'
+    try:
+        with open(path, 'rb') as source, open(tmp_path, 'wb') as raw:
+            with _open_compressed(raw, fmt) as compressed:
+                shutil.copyfileobj(source, compressed, CHUNK_SIZE)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return target
+
+def compress_all(paths, formats=FORMATS, max_workers=None, force=False):
+    """Build the compressed variants of `paths` in parallel; return all their names.
+
+    Variants that are up to date are only rebuilt with `force`.
+    """
+    targets = [f'{path}.{fmt}' for path in paths for fmt in formats]
+    jobs = [(path, fmt) for path in paths for fmt in formats if force or not up_to_date(path, fmt)]
+    if not jobs:
+        return targets
+    # Largest first, so the longest job is not left until last
+    jobs.sort(key=lambda job: os.path.getsize(job[0]), reverse=True)
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(compress_file, path, fmt) for path, fmt in jobs]
+        for future in futures:
+            future.result()
+    return targets
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the .gz/.xz variants of published files.")
+    parser.add_argument('paths', nargs='+', metavar='FILE')
+    parser.add_argument('--force', action='store_true', help='rebuild variants that are up to date')
+    args = parser.parse_args()
+    for path in args.paths:
+        size = os.path.getsize(path)
+        print(f"{path}: {size} bytes")
+    for target in compress_all(args.paths, force=args.force):
+        print(f"  {target}: {os.path.getsize(target)} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,592 @@
+"""Local relay that serves the playlist's channels over one upstream connection each.
+
+    python relay.py playlist.m3u --port 8080
+    # players then open http://HOST:8080/playlist.m3u
+
+Every playlist entry becomes /channel/<n>.ts or /channel/<n>.m3u8:
+
+- continuous MPEG-TS streams (Xtream `.ts` URLs) are read once upstream
+  and fanned out to every client watching the channel; clients that join
+  get the most recent data straight away
+- HLS playlists are rewritten so their segments come through the relay,
+  where each one is fetched once and kept in an LRU cache bounded in bytes
+
+When upstream fails, clients get the offline slate from assets/offline
+instead of a hung connection, and the channel goes back to upstream once
+it recovers. /metrics serves the relay's counters for Prometheus.
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from http import HTTPStatus
+from urllib.parse import urljoin, urlsplit
+
+import metrics
+from m3u import iter_entries
+
+OFFLINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'offline')
+OFFLINE_PLAYLIST = 'stream-offline.m3u8'
+HOST = '127.0.0.1'
+PORT = 8080
+CACHE_MB = 256
+TIMEOUT = 10
+MAX_REDIRECTS = 5
+MAX_BODY = 64 * 1024 * 1024  # largest playlist or segment the relay will hold
+TS_PACKET = 188
+CHUNK_SIZE = TS_PACKET * 348  # about 64 KB of whole TS packets
+BACKLOG_CHUNKS = 32  # recent TS chunks handed to clients that join
+CLIENT_QUEUE = 128  # TS chunks a client may fall behind before it is dropped
+IDLE_TIMEOUT = 10  # keep an unwatched stream open this long in case a player reconnects
+RETRY_DELAY = 5
+MAX_RETRY_DELAY = 60
+PLAYLIST_TTL = 1.0  # share one upstream playlist fetch between clients for this long
+SLATE_WINDOW = 5  # segments in the looping slate playlist
+MAX_TOKENS = 4096  # upstream URLs remembered per HLS channel
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+ROUTES = ('playlist.m3u', 'metrics', 'offline', 'channel')
+CONTENT_TYPES = {
+    '.m3u': 'audio/x-mpegurl',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+}
+
+class UpstreamError(Exception):
+    """An upstream request failed or did not return 200."""
+
+class Response:
+    """The body of an upstream response, read as it arrives."""
+
+    def __init__(self, url, reader, writer, headers, timeout):
+        self.url = url
+        self.headers = headers
+        self._reader = reader
+        self._writer = writer
+        self._timeout = timeout
+
+    async def _read(self, coro):
+        try:
+            return await asyncio.wait_for(coro, self._timeout)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            raise UpstreamError(f"{type(e).__name__} reading {self.url}") from e
+
+    async def chunks(self, size=CHUNK_SIZE):
+        """Yield the body as it arrives, de-chunked."""
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                line = await self._read(self._reader.readline())
+                try:
+                    length = int(line.split(b';')[0].strip() or b'0', 16)
+                except ValueError:
+                    raise UpstreamError(f"bad chunk in {self.url}") from None
+                if not length:
+                    return
+                data = await self._read(self._reader.readexactly(length + 2))
+                yield data[:-2]
+        remaining = int(self.headers['content-length']) if 'content-length' in self.headers else None
+        while remaining is None or remaining > 0:
+            data = await self._read(self._reader.read(size if remaining is None else min(size, remaining)))
+            if not data:
+                if remaining:
+                    raise UpstreamError(f"{self.url} ended early")
+                return
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+
+    async def read(self, limit=MAX_BODY):
+        """Return the whole body."""
+        parts = []
+        size = 0
+        async for data in self.chunks():
+            size += len(data)
+            if size > limit:
+                raise UpstreamError(f"{self.url} is larger than {limit} bytes")
+            parts.append(data)
+        return b''.join(parts)
+
+    def close(self):
+        self._writer.close()
+
+async def open_upstream(url, timeout=TIMEOUT):
+    """GET `url`, following redirects, and return the Response once its body starts.
+
+    Raises UpstreamError when the request fails or the status is not 200.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise UpstreamError(f"unsupported URL: {url}")
+        metrics.inc('relay_upstream_requests_total', host=parts.hostname)
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80),
+                                        ssl=parts.scheme == 'https' or None),
+                timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise UpstreamError(f"{type(e).__name__} connecting to {parts.hostname}") from e
+        host = parts.hostname + (f':{parts.port}' if parts.port else '')
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        request = [f'GET {target} HTTP/1.1', f'Host: {host}', 'Accept: */*', 'Connection: close']
+        request += [f'{name}: {value}' for name, value in HEADERS.items()]
+        writer.write(('\r\n'.join(request) + '\r\n\r\n').encode('latin-1'))
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+            status, headers = parse_head(head)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError) as e:
+            writer.close()
+            raise UpstreamError(f"{type(e).__name__} from {parts.hostname}") from e
+        if status in (301, 302, 303, 307, 308) and 'location' in headers:
+            writer.close()
+            url = urljoin(url, headers['location'])
+            continue
+        if status != 200:
+            writer.close()
+            raise UpstreamError(f"HTTP {status} from {parts.hostname}")
+        return Response(url, reader, writer, headers, timeout)
+    raise UpstreamError(f"too many redirects for {url}")
+
+def parse_head(head):
+    """Return (status or method and target, {lower-case header: value}) of an HTTP head."""
+    lines = head.decode('latin-1').split('\r\n')
+    first = lines[0].split(' ', 2)
+    if len(first) < 2:
+        raise ValueError(f"malformed HTTP head: {lines[0]!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    if first[0].startswith('HTTP/'):
+        return int(first[1]), headers
+    return (first[0], first[1]), headers
+
+class LRUCache:
+    """Response bodies kept in least-recently-used order up to `max_bytes` in total.
+
+    Concurrent fetches of a key that is not cached share one upstream
+    request, and a client that goes away does not cancel it for the others.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (data, expires)
+        self._pending = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, data, ttl=None):
+        if len(data) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (data, time.monotonic() + ttl if ttl is not None else None)
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            metrics.inc('relay_cache_evictions_total')
+        metrics.gauge('relay_cache_bytes', self.size)
+
+    def _remove(self, key):
+        data, _ = self._entries.pop(key)
+        self.size -= len(data)
+
+    async def fetch(self, key, load, ttl=None):
+        """Return the cached body for `key`, calling `load()` once if there is none."""
+        data = self.get(key)
+        if data is not None:
+            metrics.inc('relay_cache_requests_total', result='hit')
+            return data
+        pending = self._pending.get(key)
+        if pending is None:
+            metrics.inc('relay_cache_requests_total', result='miss')
+            pending = self._pending[key] = asyncio.ensure_future(load())
+            pending.add_done_callback(lambda future: self._loaded(key, future, ttl))
+        else:
+            metrics.inc('relay_cache_requests_total', result='shared')
+        return await asyncio.shield(pending)
+
+    def _loaded(self, key, future, ttl):
+        del self._pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self.put(key, future.result(), ttl)
+
+class Slate:
+    """The offline slate: an HLS playlist and its segments on disk, played in a loop."""
+
+    def __init__(self, directory=OFFLINE_DIR, playlist=OFFLINE_PLAYLIST):
+        self.directory = directory
+        self.segments = []  # (file name, duration)
+        duration = None
+        with open(os.path.join(directory, playlist), encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('#EXTINF:'):
+                    duration = float(line[len('#EXTINF:'):].split(',')[0])
+                elif line and not line.startswith('#') and duration is not None:
+                    self.segments.append((line, duration))
+                    duration = None
+        if not self.segments:
+            raise ValueError(f"no segments in {playlist}")
+        self.names = {name for name, _ in self.segments}
+        self.length = sum(duration for _, duration in self.segments)
+
+    def path(self, name):
+        """Return the file of a slate segment, or None for anything else."""
+        return os.path.join(self.directory, name) if name in self.names else None
+
+    def live_playlist(self, now=None):
+        """Return the slate as a live playlist that loops forever, following the wall clock."""
+        now = time.time() if now is None else now
+        cycles, offset = divmod(now, self.length)
+        index = 0
+        while offset >= self.segments[index][1]:
+            offset -= self.segments[index][1]
+            index += 1
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{math.ceil(max(duration for _, duration in self.segments))}',
+            f'#EXT-X-MEDIA-SEQUENCE:{int(cycles) * len(self.segments) + index}',
+            f'#EXT-X-DISCONTINUITY-SEQUENCE:{int(cycles)}',
+        ]
+        for n in range(SLATE_WINDOW):
+            name, duration = self.segments[(index + n) % len(self.segments)]
+            if n and (index + n) % len(self.segments) == 0:
+                lines.append('#EXT-X-DISCONTINUITY')
+            lines += [f'#EXTINF:{duration:.6f},', f'/offline/{name}']
+        return ('\n'.join(lines) + '\n').encode()
+
+class StreamChannel:
+    """A continuous MPEG-TS channel: one upstream connection shared by every client."""
+    extension = '.ts'
+
+    def __init__(self, relay, number, url):
+        self.relay = relay
+        self.number = number
+        self.url = url
+        self.clients = set()  # one queue of chunks per client
+        self.backlog = deque(maxlen=BACKLOG_CHUNKS)
+        self.online = False
+        self._pump = None
+        self._left = 0  # when the last client went away
+
+    async def serve(self, reader, writer):
+        """Stream the channel to a client until it disconnects or falls too far behind."""
+        queue = asyncio.Queue(CLIENT_QUEUE)
+        for chunk in self.backlog:
+            queue.put_nowait(chunk)
+        self.clients.add(queue)
+        # Notice a client hanging up even while upstream sends nothing
+        hangup = asyncio.ensure_future(reader.read())
+        hangup.add_done_callback(lambda _: self.drop(queue))
+        metrics.gauge('relay_clients', len(self.clients), channel=self.number)
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.ensure_future(self.pump())
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            hangup.cancel()
+            self.clients.discard(queue)
+            self._left = time.monotonic()
+            metrics.gauge('relay_clients', len(self.clients), channel=self.number)
+
+    def watched(self):
+        return bool(self.clients) or time.monotonic() - self._left < IDLE_TIMEOUT
+
+    def publish(self, chunk):
+        self.backlog.append(chunk)
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(chunk)
+            except asyncio.QueueFull:
+                # Too slow to keep up: drop the client rather than buffer without bound
+                metrics.inc('relay_slow_clients_total', channel=self.number)
+                self.drop(queue)
+
+    def drop(self, queue):
+        """Make a client's serve() return."""
+        self.clients.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def pump(self):
+        """Copy upstream to the clients, playing the slate while upstream is down."""
+        delay = RETRY_DELAY
+        while self.watched():
+            try:
+                response = await open_upstream(self.url)
+            except UpstreamError as e:
+                error = e
+            else:
+                self.online = True
+                self.backlog.clear()
+                try:
+                    async for chunk in _packets(response.chunks()):
+                        self.publish(chunk)
+                        delay = RETRY_DELAY
+                        if not self.watched():
+                            return
+                    error = 'stream ended'
+                except UpstreamError as e:
+                    error = e
+                finally:
+                    response.close()
+                    self.online = False
+            print(f"Channel {self.number}: {error}, playing the slate for {delay}s")
+            metrics.inc('relay_upstream_failures_total', channel=self.number)
+            await self.play_slate(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    async def play_slate(self, seconds):
+        """Publish slate segments at their own pace for `seconds`."""
+        slate = self.relay.slate
+        started = time.monotonic()
+        index = int(started) % len(slate.segments)
+        while self.watched() and time.monotonic() - started < seconds:
+            name, duration = slate.segments[index]
+            data = await self.relay.cache.fetch(('offline', name), _load_file(slate.path(name)))
+            for start in range(0, len(data), CHUNK_SIZE):
+                self.publish(data[start:start + CHUNK_SIZE])
+            metrics.inc('relay_slate_segments_total', channel=self.number)
+            await asyncio.sleep(duration)
+            index = (index + 1) % len(slate.segments)
+
+async def _packets(chunks):
+    """Re-cut a byte stream into chunks of whole TS packets."""
+    buffer = b''
+    async for data in chunks:
+        buffer += data
+        end = len(buffer) - len(buffer) % TS_PACKET
+        if end:
+            yield buffer[:end]
+            buffer = buffer[end:]
+
+def _load_file(path):
+    async def load():
+        return await asyncio.get_running_loop().run_in_executor(None, _read_file, path)
+    return load
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+class HLSChannel:
+    """An HLS channel whose playlists are rewritten to fetch segments through the relay."""
+    extension = '.m3u8'
+
+    def __init__(self, relay, number, url):
+        self.relay = relay
+        self.number = number
+        self.url = url
+        self.urls = OrderedDict()  # token -> upstream URL of a variant playlist, key or segment
+        self._down_until = 0  # serve the slate without asking upstream until then
+        self._delay = RETRY_DELAY
+
+    def token(self, url):
+        """Return the relay name of an upstream URL."""
+        path = urlsplit(url).path
+        extension = os.path.splitext(path)[1][:8]
+        token = hashlib.sha1(url.encode()).hexdigest()[:16] + extension
+        self.urls[token] = url
+        self.urls.move_to_end(token)
+        while len(self.urls) > MAX_TOKENS:
+            self.urls.popitem(last=False)
+        return token
+
+    def rewrite(self, text, base_url):
+        """Point every URI of an upstream playlist at the relay."""
+        lines = []
+        for line in text.splitlines():
+            if line and not line.startswith('#'):
+                line = f'/channel/{self.number}/{self.token(urljoin(base_url, line.strip()))}'
+            elif 'URI="' in line:
+                head, _, rest = line.partition('URI="')
+                uri, _, tail = rest.partition('"')
+                line = f'{head}URI="/channel/{self.number}/{self.token(urljoin(base_url, uri))}"{tail}'
+            lines.append(line)
+        return ('\n'.join(lines) + '\n').encode()
+
+    async def playlist(self, url=None):
+        """Return a rewritten upstream playlist, or the looping slate if upstream fails."""
+        url = url or self.url
+
+        async def load():
+            response = await open_upstream(url)
+            try:
+                body = await response.read()
+            finally:
+                response.close()
+            return self.rewrite(body.decode('utf-8', errors='replace'), response.url)
+
+        if time.monotonic() < self._down_until:
+            return self.relay.slate.live_playlist()
+        try:
+            body = await self.relay.cache.fetch(('playlist', url), load, ttl=PLAYLIST_TTL)
+        except UpstreamError as e:
+            # Clients waiting on the same fetch all get here, report it once
+            if time.monotonic() >= self._down_until:
+                print(f"Channel {self.number}: {e}, serving the slate for {self._delay}s")
+                metrics.inc('relay_upstream_failures_total', channel=self.number)
+                self._down_until = time.monotonic() + self._delay
+                self._delay = min(self._delay * 2, MAX_RETRY_DELAY)
+            return self.relay.slate.live_playlist()
+        self._delay = RETRY_DELAY
+        return body
+
+    async def segment(self, token):
+        """Return (body, content type) for a rewritten URI, or None if the token is unknown."""
+        url = self.urls.get(token)
+        if url is None:
+            return None
+        if token.endswith('.m3u8'):
+            return await self.playlist(url), CONTENT_TYPES['.m3u8']
+
+        async def load():
+            response = await open_upstream(url)
+            try:
+                return await response.read()
+            finally:
+                response.close()
+        return await self.relay.cache.fetch(('segment', url), load), CONTENT_TYPES.get(
+            os.path.splitext(token)[1], 'application/octet-stream')
+
+class Relay:
+    """The channels of a playlist and the HTTP endpoint that serves them."""
+
+    def __init__(self, entries, cache_bytes=CACHE_MB * 1024 * 1024, slate=None):
+        self.entries = entries
+        self.cache = LRUCache(cache_bytes)
+        self.slate = slate or Slate()
+        self.channels = []
+        for number, entry in enumerate(entries):
+            url = entry.url or ''
+            kind = HLSChannel if urlsplit(url).path.lower().endswith('.m3u8') else StreamChannel
+            self.channels.append(kind(self, number, url))
+
+    def playlist(self, base_url):
+        """Return the playlist with every entry pointing at the relay."""
+        parts = ['#EXTM3U\n']
+        for entry, channel in zip(self.entries, self.channels):
+            parts.append(entry.with_url(f'{base_url}/channel/{channel.number}{channel.extension}').to_m3u())
+        return ''.join(parts).encode()
+
+    async def handle(self, reader, writer):
+        """Serve one request and close the connection."""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), TIMEOUT)
+            (method, target), headers = parse_head(head)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError):
+            writer.close()
+            return
+        try:
+            if method not in ('GET', 'HEAD'):
+                await respond(writer, HTTPStatus.METHOD_NOT_ALLOWED)
+            else:
+                await self.route(reader, writer, urlsplit(target).path, headers, method == 'HEAD')
+        except ConnectionError:
+            pass
+        except UpstreamError as e:
+            await respond(writer, HTTPStatus.BAD_GATEWAY, str(e).encode())
+        finally:
+            writer.close()
+
+    async def route(self, reader, writer, path, headers, head_only):
+        parts = path.strip('/').split('/')
+        metrics.inc('relay_requests_total', route=parts[0] if parts[0] in ROUTES else 'other')
+        if path == '/playlist.m3u':
+            base_url = f"http://{headers.get('host', f'{HOST}:{PORT}')}"
+            await respond(writer, HTTPStatus.OK, self.playlist(base_url), CONTENT_TYPES['.m3u'], head_only)
+        elif path == '/metrics':
+            await respond(writer, HTTPStatus.OK, metrics.REGISTRY.to_prometheus().encode(),
+                          'text/plain; version=0.0.4', head_only)
+        elif parts[0] == 'offline' and len(parts) == 2 and self.slate.path(parts[1]):
+            data = await self.cache.fetch(('offline', parts[1]), _load_file(self.slate.path(parts[1])))
+            await respond(writer, HTTPStatus.OK, data, CONTENT_TYPES['.ts'], head_only)
+        elif parts[0] == 'channel' and len(parts) in (2, 3):
+            channel = self.channel(parts[1])
+            if channel is None:
+                await respond(writer, HTTPStatus.NOT_FOUND)
+            elif len(parts) == 3 and isinstance(channel, HLSChannel):
+                result = await channel.segment(parts[2])
+                if result is None:
+                    await respond(writer, HTTPStatus.NOT_FOUND)
+                else:
+                    await respond(writer, HTTPStatus.OK, result[0], result[1], head_only)
+            elif len(parts) == 3:
+                await respond(writer, HTTPStatus.NOT_FOUND)
+            elif isinstance(channel, HLSChannel):
+                await respond(writer, HTTPStatus.OK, await channel.playlist(), CONTENT_TYPES['.m3u8'], head_only)
+            else:
+                await respond(writer, HTTPStatus.OK, None, CONTENT_TYPES['.ts'], head_only)
+                if not head_only:
+                    await channel.serve(reader, writer)
+        else:
+            await respond(writer, HTTPStatus.NOT_FOUND)
+
+    def channel(self, name):
+        """Return the channel for "<n>", "<n>.ts" or "<n>.m3u8", or None."""
+        number, _, extension = name.partition('.')
+        if not number.isdigit() or int(number) >= len(self.channels):
+            return None
+        channel = self.channels[int(number)]
+        return channel if not extension or '.' + extension == channel.extension else None
+
+async def respond(writer, status, body=b'', content_type='text/plain', head_only=False):
+    """Send a response head and `body`; a None body leaves the response open for streaming."""
+    lines = [f'HTTP/1.1 {status.value} {status.phrase}', f'Content-Type: {content_type}',
+             'Connection: close', 'Cache-Control: no-cache']
+    if body is not None:
+        lines.append(f'Content-Length: {len(body)}')
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    if body and not head_only:
+        writer.write(body)
+    await writer.drain()
+
+async def serve(relay, host=HOST, port=PORT):
+    server = await asyncio.start_server(relay.handle, host, port)
+    print(f"Relaying {len(relay.channels)} channels on http://{host}:{port}/playlist.m3u")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay playlist channels through one upstream connection each.")
+    parser.add_argument('playlist', nargs='?', default='playlist.m3u')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--cache-mb', type=int, default=CACHE_MB, help='segment cache size')
+    parser.add_argument('--offline-dir', default=OFFLINE_DIR, help='directory of the offline slate')
+    args = parser.parse_args()
+
+    with open(args.playlist, encoding='utf-8') as f:
+        entries = [entry for entry in iter_entries(f) if entry.url]
+    relay = Relay(entries, args.cache_mb * 1024 * 1024, Slate(args.offline_dir))
+    try:
+        asyncio.run(serve(relay, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
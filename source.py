@@ -1,27 +1,125 @@
-import requests
+import argparse
+import io
+import os
 import re
+from collections import Counter
+from contextlib import ExitStack
+
+import requests
+
+import metrics
+from channel_index import EPG_CHANNELS_FILE, ChannelIndex, EntryResolver
+from m3u import iter_entries, read_records
+from publish import DIFF_SUFFIX, compress_all, publish_changes
 
 # Config
 URL = "http://livepptv.net/get.php?username=299819323222593&password=1593574628&type=m3u_plus&output=ts"
-GROUP_WHITELIST = ["FRANCE H265", "FRANCE FHD", "FRANCE HD", "FRANCE SD", "SPORT FR", "SPORT AR", "ALGERIA", "ARABIC+", "ARABIC"] # Change this to your desired groups
+GROUP_WHITELIST = {"FRANCE H265", "FRANCE FHD", "FRANCE HD", "FRANCE SD", "SPORT FR", "SPORT AR", "ALGERIA", "ARABIC+", "ARABIC"} # Change this to your desired groups
 OUTPUT_FILE = "playlist.m3u"
+GROUP_DIR = "playlists"  # one playlist per whitelisted group goes here
+UNMAPPED_REPORT = "unmapped_channels.json"  # kept entries with no EPG channel
+TIMEOUT = 60
+
+def group_filename(group, directory=GROUP_DIR):
+    """Return the per-group playlist path, e.g. "SPORT FR" -> playlists/sport-fr.m3u."""
+    slug = re.sub(r'[^a-z0-9]+', '-', group.lower().replace('+', ' plus')).strip('-')
+    return os.path.join(directory, slug + '.m3u')
+
+def filter_playlist(stream, output, whitelist=GROUP_WHITELIST, group_outputs=None, resolver=None):
+    """Write the entries whose group-title is whitelisted to `output`.
+
+    `stream` is a text stream of the provider playlist. If `group_outputs`
+    maps group titles to files, each entry is also written to its group's
+    file. If an EntryResolver is given, kept entries get the tvg-id of
+    their EPG channel. Returns the number of entries written to `output`.
+    """
+    output.write("#EXTM3U\n")
+    for group_output in (group_outputs or {}).values():
+        group_output.write("#EXTM3U\n")
+    seen = 0
+    kept = Counter()
+    for entry in iter_entries(stream):
+        seen += 1
+        group = entry.group_title
+        if group in whitelist:
+            if resolver is not None:
+                entry = resolver.resolve(entry)
+            text = entry.to_m3u()
+            output.write(text)
+            if group_outputs and group in group_outputs:
+                group_outputs[group].write(text)
+            kept[group] += 1
+    
+    metrics.inc('playlist_entries_seen_total', seen)
+    for group, count in kept.items():
+        metrics.inc('playlist_entries_kept_total', count, group=group)
+    if resolver is not None:
+        metrics.inc('playlist_entries_resolved_total', resolver.resolved)
+        metrics.inc('playlist_entries_unmapped_total', sum(kept.values()) - resolver.resolved)
+    return sum(kept.values())
+
+def open_playlist(url=None, session=None, timeout=TIMEOUT):
+    """Open the provider playlist as a text stream."""
+    response = (session or requests).get(url or URL, stream=True, timeout=timeout)
+    response.raise_for_status()
+    response.raw.decode_content = True
+    response.raw.auto_close = False  # let TextIOWrapper see EOF instead of a closed file
+    return io.TextIOWrapper(response.raw, encoding='utf-8', errors='replace')
+
+def load_resolver(path=EPG_CHANNELS_FILE):
+    """Return an EntryResolver over the channels of the published EPG, or None."""
+    if not os.path.exists(path):
+        print(f"No {path} found, leaving playlist tvg-ids as they are")
+        return None
+    index = ChannelIndex.from_channels_file(path)
+    print(f"Resolving tvg-ids against {len(index)} EPG channels")
+    return EntryResolver(index)
+
+def main(session=None, resolver=None):
+    """Refresh the playlists.
+
+    A long-running caller can pass its own requests `session` and
+    EntryResolver to reuse them across runs.
+    """
+    os.makedirs(GROUP_DIR, exist_ok=True)
+    outputs = [OUTPUT_FILE] + [group_filename(group) for group in sorted(GROUP_WHITELIST)]
+    if resolver is None:
+        resolver = load_resolver()
+    
+    # Download and filter the playlist chunk by chunk, splitting it by group
+    with metrics.stage('playlist', 'filter'):
+        with open_playlist(session=session) as stream, ExitStack() as files:
+            def open_tmp(path):
+                return files.enter_context(open(path + '.tmp', 'w', encoding='utf-8'))
+            
+            output = open_tmp(OUTPUT_FILE)
+            group_outputs = {group: open_tmp(group_filename(group)) for group in GROUP_WHITELIST}
+            count = filter_playlist(stream, output, group_outputs=group_outputs, resolver=resolver)
+            metrics.gauge('playlist_download_bytes', stream.buffer.tell())
+        # Files whose content did not change are left alone; the combined
+        # playlist also gets a diff of the entries that did
+        changed = [path for path in outputs
+                   if publish_changes(path + '.tmp', path, read_records if path == OUTPUT_FILE else None)]
+    metrics.gauge('playlist_files_changed', len(changed))
+    print(f"Wrote {count} channels to {OUTPUT_FILE} and {len(GROUP_WHITELIST)} group playlists in {GROUP_DIR}/")
+    if OUTPUT_FILE in changed:
+        print(f"{len(changed)} of {len(outputs)} playlists changed, changes in {OUTPUT_FILE}{DIFF_SUFFIX}")
+    else:
+        print("Playlist unchanged")
+    if resolver is not None:
+        resolver.write_report(UNMAPPED_REPORT)
+        print(f"Matched {resolver.resolved} channels to the EPG, "
+              f"{len(resolver.unmapped)} unmapped listed in {UNMAPPED_REPORT}")
+    
+    # Pre-compressed copies for clients that accept gzip/xz, rebuilt for changed playlists
+    with metrics.stage('playlist', 'compress'):
+        compressed = compress_all(outputs)
+    print("Compressed the changed playlists to .gz and .xz")
+    for path in outputs + compressed:
+        metrics.gauge('playlist_output_bytes', os.path.getsize(path), file=path)
 
-# Download playlist
-response = requests.get(URL)
-data = response.text
-
-# Split entries
-entries = data.split("#EXTINF")
-filtered_entries = []
-
-for entry in entries:
-    if 'group-title="' in entry:
-        match = re.search(r'group-title="([^"]+)"', entry)
-        if match:
-            group = match.group(1)
-            if group in GROUP_WHITELIST:
-                filtered_entries.append("#EXTINF" + entry)
-
-# Save result
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write("#EXTM3U\n" + "".join(filtered_entries))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filter the provider playlist by group.")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.run('playlist', main, args)